@@ -0,0 +1,256 @@
+import gzip
+import hashlib
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, request
+from sqlalchemy import func, select
+
+from autocomplete import MODELS, autocomplete
+from models import db, Show, Venue, Artist, ArtistRecommendation, VenueRecommendation
+from queries import venue_directory, artist_listing, show_listing, nearby_venues
+from scheduling import schedule_shows
+from search import search_names
+from versions import table_versions
+from utils import page_args, window_args, nearby_args, show_list_limits, venue_view_data, artist_view_data
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#
+# Every response carries a strong ETag computed from cheap reads (the table
+# write counters of versions.py and updated_at row versions) before the
+# payload is built, so a client sending a current If-None-Match gets a 304
+# without the view data being read at all. Bodies are compressed with brotli when the package
+# is installed, gzip otherwise, and the encoding is appended to the ETag as
+# a compressed body is a different representation.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def version_of(*tables):
+    """Versions that change whenever a row of one of ``tables`` does."""
+    return table_versions(*[t.name for t in tables])
+
+
+def detail_version(model, key_column, entity_id):
+    """Row version of one venue or artist and of what its page shows.
+
+    That is its own updated_at, the latest updated_at on the other side of
+    its shows, its upcoming shows count, which changes as shows start, and
+    when its recommendations were computed.
+    """
+    other = Artist if model is Venue else Venue
+    other_column = Show.c.artist_id if model is Venue else Show.c.venue_id
+    recommendation = VenueRecommendation if model is Venue else ArtistRecommendation
+    recommendation_key = VenueRecommendation.venue_id if model is Venue else ArtistRecommendation.artist_id
+    version = db.session.query(
+        model.updated_at,
+        select([func.max(other.updated_at)]).select_from(Show.join(other, other_column == other.id))
+        .where(key_column == model.id).as_scalar(),
+        select([func.count()]).select_from(Show)
+        .where(key_column == model.id).where(Show.c.start_time > datetime.now()).as_scalar(),
+        select([func.max(recommendation.computed_at)]).where(recommendation_key == model.id).as_scalar(),
+    ).filter(model.id == entity_id).one_or_none()
+
+    if version is None:
+        abort(404)
+    return list(version)
+
+
+def isoformat(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def conditional(version, build):
+    """A JSON response of ``build()``, or 304 when the client's copy is current.
+
+    The ETag hashes ``version`` together with the request path and query
+    string, so each page or filter of a listing has its own.
+    """
+    etag = hashlib.sha1(json.dumps(
+        [request.full_path] + version, default=isoformat).encode()).hexdigest()
+
+    for suffix in ('', '-gzip', '-br'):
+        if request.if_none_match.contains(etag + suffix):
+            response = Response(status=304)
+            response.set_etag(etag + suffix)
+            return response
+
+    response = Response(json.dumps(build(), default=isoformat), mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
+def error_response(message, status):
+    return Response(json.dumps({"error": message}), status=status, mimetype='application/json')
+
+
+@api.errorhandler(400)
+def bad_request_error(error):
+    return error_response('Bad request', 400)
+
+
+@api.errorhandler(404)
+def not_found_error(error):
+    return error_response('Not found', 404)
+
+
+@api.after_request
+def compress(response):
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or len(response.get_data()) < current_app.config['API_COMPRESS_MIN_SIZE']):
+        return response
+
+    if brotli is not None and request.accept_encodings['br']:
+        encoding = 'br'
+        response.set_data(brotli.compress(response.get_data(), quality=5))
+    elif request.accept_encodings['gzip']:
+        encoding = 'gzip'
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+    else:
+        return response
+
+    response.headers['Content-Encoding'] = encoding
+    etag, _ = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+def search_args():
+    return request.args.get('search_term', ''), {
+        "city": request.args.get('city', ''),
+        "state": request.args.get('state', ''),
+        "genre": request.args.get('genre', ''),
+    }
+
+
+def search(model):
+    search_term, filters = search_args()
+
+    def build():
+        count, rows = search_names(
+            model, search_term, current_app.config['SEARCH_RESULTS_LIMIT'], **filters)
+        return {"count": count, "data": [r._asdict() for r in rows]}
+
+    return conditional(version_of(model.__table__), build)
+
+
+@api.route('/autocomplete')
+def autocomplete_names():
+    """Venue and artist names with a word starting with ``q``, for type-ahead.
+
+    Served from the in-memory name indexes, see autocomplete.py. ``kind``
+    limits the answer to venues or artists.
+    """
+    prefix = request.args.get('q', '')
+    kind = request.args.get('kind')
+    kinds = [kind] if kind in MODELS else list(MODELS)
+    limit = min(max(request.args.get('limit', current_app.config['AUTOCOMPLETE_LIMIT'], type=int), 1),
+                current_app.config['AUTOCOMPLETE_MAX_LIMIT'])
+    return Response(json.dumps({k: autocomplete.search(k, prefix, limit) for k in kinds}),
+                    mimetype='application/json')
+
+#  Venues
+#  ----------------------------------------------------------------
+
+
+@api.route('/venues')
+def venues():
+    return conditional(version_of(Venue.__table__), lambda: venue_directory(
+        genre=request.args.get('genre'), **page_args()))
+
+
+@api.route('/venues/search')
+def search_venues():
+    return search(Venue)
+
+
+@api.route('/venues/nearby')
+def venues_nearby():
+    """Venues within ``radius`` miles of ``lat`` and ``lng``, or of venue ``venue_id``.
+
+    Venues are located by their city, see geo.py, and listed closest first
+    with their distance in miles.
+    """
+    args = nearby_args()
+
+    def build():
+        data = nearby_venues(**args)
+        return {"count": len(data), "data": data}
+
+    return conditional(version_of(Venue.__table__), build)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    version = detail_version(Venue, Show.c.venue_id, venue_id)
+    return conditional(version, lambda: venue_view_data(venue_id, show_list_limits()))
+
+#  Artists
+#  ----------------------------------------------------------------
+
+
+@api.route('/artists')
+def artists():
+    return conditional(version_of(Artist.__table__), lambda: artist_listing(
+        genre=request.args.get('genre'), **page_args()))
+
+
+@api.route('/artists/search')
+def search_artists():
+    return search(Artist)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    version = detail_version(Artist, Show.c.artist_id, artist_id)
+    return conditional(version, lambda: artist_view_data(artist_id, show_list_limits()))
+
+#  Shows
+#  ----------------------------------------------------------------
+
+
+@api.route('/shows')
+def shows():
+    version = version_of(Show, Venue.__table__, Artist.__table__)
+    args = dict(window_args(), **page_args())
+    return conditional(version, lambda: show_listing(**args))
+
+
+@api.route('/shows/bulk', methods=['POST'])
+def schedule():
+    """Schedule a list of shows, e.g. a tour, in one transaction.
+
+    The body is a JSON list of {"venue_id", "artist_id", "start_time"}, or
+    {"shows": [...], "atomic": true} to schedule nothing unless every show
+    fits. Answers with the number of shows scheduled and the rejected ones.
+    """
+    body = request.get_json(silent=True)
+    atomic = request.args.get('atomic') == '1'
+    if isinstance(body, dict):
+        atomic = atomic or bool(body.get('atomic'))
+        body = body.get('shows')
+    if not isinstance(body, list) or not all(isinstance(row, dict) for row in body):
+        return error_response('Expected a JSON list of shows.', 400)
+    if len(body) > current_app.config['SCHEDULE_MAX_SHOWS']:
+        return error_response(f'At most {current_app.config["SCHEDULE_MAX_SHOWS"]} shows at once.', 413)
+
+    shows, rejects = schedule_shows(body, atomic)
+    status = 201 if not rejects else 200 if shows else 422
+    return Response(json.dumps({
+        "scheduled": len(shows),
+        "rejected": [{"index": index, "show": row, "errors": errors} for index, row, errors in rejects],
+    }, default=isoformat), status=status, mimetype='application/json')
@@ -2,23 +2,38 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
 from datetime import datetime
 
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import (Flask, render_template, request, Response, flash, redirect, url_for, abort,
+                   stream_with_context)
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from flask_wtf import Form
-from sqlalchemy import func
 
 import logging
 from logging import Formatter, FileHandler
 
+from config import get_config
 from forms import *
-from utils import VenueViewData, ArtistViewData
+from models import db, Show, Venue, Artist
+from queries import venue_directory, artist_listing, show_listing
+from search import search_names
+from routing import reads_from_replica
+from diagnostics import explain_queries_command
+from cache import cache
+from instrumentation import instrumentation
+from counters import discount_shows_of, rollover_show_counters_command
+from importer import import_data_command
+from exporter import FORMATS, export_rows, generate, export_data_command
+from scheduling import schedule_shows, schedule_shows_command
+from partitions import create_show_partitions_command
+from geo import locate, geocode_venues_command
+from autocomplete import autocomplete
+from recommend import compute_recommendations_command
+from api import api
+from templating import setup_templates
+from assets import assets
+from filters import display_settings, format_datetime
+from utils import page_args, window_args, show_list_limits, venue_view_data, artist_view_data
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -26,96 +41,34 @@ from utils import VenueViewData, ArtistViewData
 
 app = Flask(__name__)
 moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
+app.config.from_object(get_config())
 
 # connect to a local postgresql database
+db.init_app(app)
 migrate = Migrate(app, db)
-#----------------------------------------------------------------------------#
-# Models.
-#----------------------------------------------------------------------------#
-
-Show = db.Table('Show',
-                db.Column('id', db.Integer, primary_key=True),
-                db.Column('venue_id', db.Integer, db.ForeignKey(
-                    'Venue.id')),
-                db.Column('artist_id', db.Integer, db.ForeignKey(
-                    'Artist.id')),
-                db.Column('start_time', db.DateTime)
-                )
-
-
-class Venue(db.Model):
-    __tablename__ = 'Venue'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String, nullable=False)
-    _genres = db.Column(db.String(120), default='')
-    address = db.Column(db.String(120), nullable=False)
-    city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.String(120), nullable=False)
-    website = db.Column(db.String(120))
-    facebook_link = db.Column(db.String(120))
-    seeking_talent = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String, nullable=True)
-    image_link = db.Column(db.String(500))
-    artists = db.relationship('Artist', secondary=Show,
-                              backref=db.backref('venues', lazy=True))
-
-    @property
-    def genres(self):
-        return [x for x in self._genres.split(',')]
-
-    @genres.setter
-    def genres(self, value):
-        self._genres = ','.join(value)
-
-    def __repr__(self):
-        return f'<Venue Id: {self.id} , Name: {self.name} Genres: {self.genres}>'
-
-
-class Artist(db.Model):
-    __tablename__ = 'Artist'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String, nullable=False)
-    _genres = db.Column(db.String(120), default='')
-    city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.String(120), nullable=False)
-    website = db.Column(db.String(120))
-    facebook_link = db.Column(db.String(120))
-    seeking_venue = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String, nullable=True)
-    image_link = db.Column(db.String(500))
-
-    @property
-    def genres(self):
-        return [x for x in self._genres.split(',')]
-
-    @genres.setter
-    def genres(self, value):
-        self._genres = ','.join(value)
-
-    def __repr__(self):
-        return f'<Artist Id: {self.id} , Name: {self.name} Genres: {self.genres}>'
+cache.init_app(app)
+assets.init_app(app)
+autocomplete.init_app(app)
+instrumentation.init_app(app)
+app.register_blueprint(api)
+
+app.cli.add_command(explain_queries_command)
+app.cli.add_command(rollover_show_counters_command)
+app.cli.add_command(import_data_command)
+app.cli.add_command(export_data_command)
+app.cli.add_command(schedule_shows_command)
+app.cli.add_command(create_show_partitions_command)
+app.cli.add_command(geocode_venues_command)
+app.cli.add_command(compute_recommendations_command)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
-
-
 app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.globals['display_settings'] = display_settings
+cache.vary(display_settings)
+setup_templates(app)
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -123,6 +76,7 @@ app.jinja_env.filters['datetime'] = format_datetime
 
 
 @app.route('/')
+@cache.cached_page()
 def index():
     return render_template('pages/home.html')
 
@@ -131,72 +85,40 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@cache.cached_page('venues')
 def venues():
-
-    data = list()
-    result_venues = Venue.query.with_entities(
-        Venue.id, Venue.name, Venue.city, Venue.state).order_by(Venue.id).all()
-
-    if(len(result_venues) > 0):
-        result_venus_shows = list()
-        distinct_city_state = list()
-
-        for v in result_venues:
-            if (v.city, v.state) not in distinct_city_state:
-                distinct_city_state.append((v.city, v.state))
-
-            shows_count = db.session.query(Show).filter(
-                Show.c.venue_id == v.id, Show.c.start_time > datetime.now()).count()
-            result_venus_shows.append({
-                **v._asdict(),
-                "num_upcoming_shows": shows_count,
-            })
-
-        for city, state in distinct_city_state:
-            data.append({
-                "city": city,
-                "state": state,
-                "venues": [v for v in result_venus_shows if v["city"] == city and v["state"] == state]
-            })
-
-    return render_template('pages/venues.html', areas=data)
+    page = venue_directory(genre=request.args.get('genre'), **page_args())
+    return render_template('pages/venues.html', areas=page["items"], page=page, genres=Genre)
 
 
 @app.route('/venues/search', methods=['POST'])
+@reads_from_replica
 def search_venues():
     response = dict()
     search_term = request.form.get('search_term', '')
+    filters = {
+        "city": request.form.get('city', ''),
+        "state": request.form.get('state', ''),
+        "genre": request.form.get('genre', ''),
+    }
 
     if search_term:
-        query_venue = Venue.query.filter(Venue.name.ilike(
-            f'%{search_term}%')).with_entities(Venue.id, Venue.name)
-        result_venues = query_venue.all()
-
-        response["count"] = len(result_venues)
-        response["data"] = list()
-
-        if len(result_venues) > 0:
+        count, result_venues = search_names(
+            Venue, search_term, app.config['SEARCH_RESULTS_LIMIT'], **filters)
 
-            for v in result_venues:
-                shows_count = db.session.query(Show).filter(
-                    Show.c.venue_id == v.id, Show.c.start_time > datetime.now()).count()
-                response["data"].append({
-                    **v._asdict(),
-                    "num_upcoming_shows": shows_count
-                })
+        response["count"] = count
+        response["data"] = [v._asdict() for v in result_venues]
 
-    return render_template('pages/search_venues.html', results=response, search_term=search_term)
+    return render_template('pages/search_venues.html', results=response, search_term=search_term,
+                           filters=filters, states=State, genres=Genre)
 
 
 @app.route('/venues/<int:venue_id>')
+@cache.cached_page('venue:{venue_id}')
 def show_venue(venue_id):
-    venue_data = Venue.query.get(venue_id)
-
-    shows_data = db.session.query(Show).join(Artist).filter(Show.c.venue_id == venue_id).with_entities(
-        Show.c.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'), func.to_char(Show.c.start_time, 'YYYY-MM-DD"T"HH24:MI:SS"Z"').label('start_time')).all()
-
-    data = VenueViewData(venue_data, shows_data)
-    return render_template('pages/show_venue.html', venue=data)
+    limits = show_list_limits()
+    data = venue_view_data(venue_id, limits)
+    return render_template('pages/show_venue.html', venue=data, limits=limits)
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -223,9 +145,12 @@ def create_venue_submission():
             new_venue.image_link = venue_form.image_link.data
             new_venue.genres = venue_form.genres.data
             new_venue.facebook_link = venue_form.facebook_link.data
+            locate(new_venue)
 
             db.session.add(new_venue)
             db.session.commit()
+            cache.invalidate('venues')
+            autocomplete.set('venues', new_venue.id, new_venue.name)
 
             # on successful db insert, flash success
             flash('Artist ' + request.form['name'] + ' was successfully listed!')
@@ -237,8 +162,6 @@ def create_venue_submission():
         flash('An error occurred. Venue ' +
               venue_form.name.data + ' could not be listed.')
         return render_template('pages/home.html')
-    finally:
-        db.session.close()
 
     return redirect(url_for('venues'))
 
@@ -252,7 +175,10 @@ def delete_venue(venue_id):
 @app.route('/venues/<venue_id>/delete', methods=['POST'])
 def delete_venue_submission(venue_id):
     try:
-        venue_data = Venue.query.get(venue_id)
+        # The venue is locked before the counters of its artists, in the
+        # order schedule_shows takes them
+        venue_data = Venue.query.filter(Venue.id == venue_id).with_for_update().one()
+        show_artists = discount_shows_of(Show.c.venue_id, venue_id)
 
         # Assume Typical many to many relationship table with composite primary key consists from the two table forien keys
         # so when deleting it expects only one row
@@ -263,12 +189,13 @@ def delete_venue_submission(venue_id):
         db.session.delete(venue_data)
 
         db.session.commit()
+        cache.invalidate('venues', 'shows', f'venue:{venue_id}',
+                         *[f'artist:{a}' for a in show_artists])
+        autocomplete.remove('venues', int(venue_id))
     except Exception as e:
         print(e)
         db.session.rollback()
         return render_template('errors/500.html')
-    finally:
-        db.session.close()
 
     return redirect(url_for('venues'))
 
@@ -278,51 +205,39 @@ def delete_venue_submission(venue_id):
 
 
 @app.route('/artists')
+@cache.cached_page('artists')
 def artists():
-    data = list()
-    query_artists = Artist.query.with_entities(
-        Artist.id, Artist.name).order_by(Artist.id).all()
-    if(len(query_artists) > 0):
-        data = [a._asdict() for a in query_artists]
-
-    return render_template('pages/artists.html', artists=data)
+    page = artist_listing(genre=request.args.get('genre'), **page_args())
+    return render_template('pages/artists.html', artists=page["items"], page=page, genres=Genre)
 
 
 @app.route('/artists/search', methods=['POST'])
+@reads_from_replica
 def search_artists():
     response = dict()
     search_term = request.form.get('search_term', '')
+    filters = {
+        "city": request.form.get('city', ''),
+        "state": request.form.get('state', ''),
+        "genre": request.form.get('genre', ''),
+    }
     if search_term:
-        query_artist = Venue.query.filter(Artist.name.ilike(
-            f'%{search_term}%')).with_entities(Artist.id, Artist.name)
-        result_artists = query_artist.all()
+        count, result_artists = search_names(
+            Artist, search_term, app.config['SEARCH_RESULTS_LIMIT'], **filters)
 
-        response["count"] = len(result_artists)
-        response["data"] = list()
+        response["count"] = count
+        response["data"] = [a._asdict() for a in result_artists]
 
-        if len(result_artists) > 0:
-
-            for a in result_artists:
-                shows_count = db.session.query(Show).filter(
-                    Show.c.artist_id == a.id, Show.c.start_time > datetime.now()).count()
-                response["data"].append({
-                    **a._asdict(),
-                    "num_upcoming_shows": shows_count
-                })
-    print(response)
-    return render_template('pages/search_artists.html', results=response, search_term=search_term)
+    return render_template('pages/search_artists.html', results=response, search_term=search_term,
+                           filters=filters, states=State, genres=Genre)
 
 
 @app.route('/artists/<int:artist_id>')
+@cache.cached_page('artist:{artist_id}')
 def show_artist(artist_id):
-
-    artist_data = Artist.query.get(artist_id)
-
-    shows_data = db.session.query(Show).join(Venue).filter(Show.c.artist_id == artist_id).with_entities(
-        Show.c.venue_id, Venue.name.label('venue_name'), Venue.image_link.label('venue_image_link'), func.to_char(Show.c.start_time, 'YYYY-MM-DD"T"HH24:MI:SS"Z"').label('start_time')).all()
-
-    data = ArtistViewData(artist_data, shows_data)
-    return render_template('pages/show_artist.html', artist=data)
+    limits = show_list_limits()
+    data = artist_view_data(artist_id, limits)
+    return render_template('pages/show_artist.html', artist=data, limits=limits)
 
 #  Update
 #  ----------------------------------------------------------------
@@ -352,8 +267,12 @@ def edit_artist_submission(artist_id):
             artist_data.image_link = artist_form_submitted.image_link.data
             artist_data.genres = artist_form_submitted.genres.data
             artist_data.facebook_link = artist_form_submitted.facebook_link.data
+            # genres live in their own table, bump the row version explicitly
+            artist_data.updated_at = datetime.utcnow()
 
             db.session.commit()
+            cache.invalidate('artists', 'shows', f'artist:{artist_id}')
+            autocomplete.set('artists', artist_id, artist_data.name)
         else:
             return render_template('forms/edit_artist.html', form=artist_form_submitted, artist_id=artist_data.id, artist_name=artist_data.name)
 
@@ -361,9 +280,6 @@ def edit_artist_submission(artist_id):
         db.session.rollback()
         return render_template('errors/500.html')
 
-    finally:
-        db.session.close()
-
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 
@@ -392,8 +308,13 @@ def edit_venue_submission(venue_id):
             venue_data.image_link = venue_form_submitted.image_link.data
             venue_data.genres = venue_form_submitted.genres.data
             venue_data.facebook_link = venue_form_submitted.facebook_link.data
+            locate(venue_data)
+            # genres live in their own table, bump the row version explicitly
+            venue_data.updated_at = datetime.utcnow()
 
             db.session.commit()
+            cache.invalidate('venues', 'shows', f'venue:{venue_id}')
+            autocomplete.set('venues', venue_id, venue_data.name)
         else:
             return render_template('forms/edit_venue.html', form=venue_form_submitted, venue_id=venue_data.id, venue_name=venue_data.name)
 
@@ -401,9 +322,6 @@ def edit_venue_submission(venue_id):
         db.session.rollback()
         return render_template('errors/500.html')
 
-    finally:
-        db.session.close()
-
     return redirect(url_for('show_venue', venue_id=venue_id))
 
 #  Create Artist
@@ -433,6 +351,8 @@ def create_artist_submission():
 
             db.session.add(new_artist)
             db.session.commit()
+            cache.invalidate('artists')
+            autocomplete.set('artists', new_artist.id, new_artist.name)
 
             # on successful db insert, flash success
             flash('Artist ' + request.form['name'] + ' was successfully listed!')
@@ -444,8 +364,6 @@ def create_artist_submission():
         flash('An error occurred. Artist ' +
               artist_form.name.data + ' could not be listed.')
         return render_template('pages/home.html')
-    finally:
-        db.session.close()
 
     return redirect(url_for('artists'))
 
@@ -460,6 +378,8 @@ def delete_artist(artist_id):
 def delete_artist_submission(artist_id):
     try:
         artist_data = Artist.query.get(artist_id)
+        show_venues = discount_shows_of(Show.c.artist_id, artist_id)
+
         # Assume Typical many to many relationship table (reflection table) with composite primary key consists from the two table forien keys
         # so when deleting it expects only one row
         # artist_data.venues.clear()
@@ -469,12 +389,13 @@ def delete_artist_submission(artist_id):
         db.session.delete(artist_data)
 
         db.session.commit()
+        cache.invalidate('artists', 'shows', f'artist:{artist_id}',
+                         *[f'venue:{v}' for v in show_venues])
+        autocomplete.remove('artists', int(artist_id))
     except Exception as e:
         print(e)
         db.session.rollback()
         return render_template('errors/500.html')
-    finally:
-        db.session.close()
 
     return redirect(url_for('artists'))
 
@@ -483,15 +404,10 @@ def delete_artist_submission(artist_id):
 
 
 @app.route('/shows')
+@cache.cached_page('shows')
 def shows():
-    data = list()
-    query_shows = db.session.query(Show).join(Venue).join(
-        Artist).with_entities(Show.c.venue_id.label('venue_id'), Venue.name.label('venue_name'), Show.c.artist_id.label('artist_id'), Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'), func.to_char(Show.c.start_time, 'YYYY-MM-DD"T"HH24:MI:SS"Z"').label('start_time')).all()
-
-    if(len(query_shows) > 0):
-        data = [s._asdict() for s in query_shows]
-
-    return render_template('pages/shows.html', shows=data)
+    page = show_listing(**window_args(), **page_args())
+    return render_template('pages/shows.html', shows=page["items"], page=page, genres=Genre)
 
 
 @app.route('/shows/create')
@@ -503,26 +419,42 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
     try:
-        form_data = request.form.to_dict()
-        print('form_data: ', form_data)
-
-        insert_show_query = Show.insert().values(
-            artist_id=form_data["artist_id"], venue_id=form_data["venue_id"], start_time=form_data["start_time"])
-
-        db.session.execute(insert_show_query)
-        db.session.commit()
-
-        # on successful db insert, flash success
-        flash('Show was successfully listed!')
-    except Exception as e:
-        db.session.rollback()
+        _, rejects = schedule_shows([request.form.to_dict()])
+    except Exception:
+        app.logger.exception('Show could not be listed.')
         flash('An error occurred. Show could not be listed.')
         return render_template('pages/home.html')
-    finally:
-        db.session.close()
 
+    if rejects:
+        _, _, errors = rejects[0]
+        flash('Show could not be listed. ' + ' '.join(
+            message for messages in errors.values() for message in messages))
+        return render_template('forms/new_show.html', form=ShowForm(request.form))
+
+    # on successful db insert, flash success
+    flash('Show was successfully listed!')
     return redirect(url_for('shows'))
 
+#  Export
+#  ----------------------------------------------------------------
+
+
+@app.route('/export/<kind>.<file_format>')
+def export(kind, file_format):
+    """Stream venues, artists or shows as a CSV or JSONL download.
+
+    Shows may be limited to one venue or artist with ?venue_id= or ?artist_id=.
+    """
+    if kind not in ('venues', 'artists', 'shows') or file_format not in FORMATS:
+        abort(404)
+
+    rows = export_rows(kind, request.args.get('venue_id', type=int),
+                       request.args.get('artist_id', type=int))
+    response = Response(stream_with_context(generate(rows, file_format)),
+                        mimetype=FORMATS[file_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{file_format}'
+    return response
+
 
 @app.errorhandler(404)
 def not_found_error(error):
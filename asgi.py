@@ -0,0 +1,37 @@
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+from app import app
+
+#----------------------------------------------------------------------------#
+# ASGI serving mode.
+#
+#   uvicorn asgi:asgi_app --workers 4
+#
+# This is uvicorn's own WSGI adapter, what `uvicorn --interface wsgi app:app`
+# runs, with its thread pool sized to ASGI_THREADS instead of a fixed 10.
+# The server keeps every client connection on its event loop, so slow or
+# idle keep-alive clients cost no thread, but each request still holds a
+# pool thread while it queries: SQLAlchemy 1.3 has no asyncio engine, so
+# the app and its database access stay synchronous. With
+# DETAIL_QUERY_WORKERS, the independent queries of the detail pages are
+# issued in parallel (see utils.in_parallel) on connections of the same
+# pool, so every request thread and worker can hold one at once.
+#----------------------------------------------------------------------------#
+
+
+def request_threads(config):
+    """ASGI_THREADS, or the threads the connection pool can serve beside the detail workers."""
+    workers = config['DETAIL_QUERY_WORKERS'] if config['DETAIL_QUERY_WORKERS'] >= 2 else 0
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return config['ASGI_THREADS'] or 32
+
+    connections = config['DB_POOL_SIZE'] + config['DB_MAX_OVERFLOW']
+    threads = config['ASGI_THREADS'] or connections - workers
+    if threads < 1 or threads + workers > connections:
+        raise RuntimeError(
+            f'{threads} ASGI_THREADS and {workers} DETAIL_QUERY_WORKERS need more than the '
+            f'{connections} connections of DB_POOL_SIZE + DB_MAX_OVERFLOW.')
+    return threads
+
+
+asgi_app = WSGIMiddleware(app, workers=request_threads(app.config))
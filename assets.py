@@ -0,0 +1,231 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import time
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+    import rjsmin
+except ImportError:
+    rcssmin = rjsmin = None
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#
+# `flask build-assets` writes every file of static/ to ASSETS_BUILD_DIR under
+# a name carrying a hash of its content, joins and minifies the BUNDLES,
+# stores gzip and brotli copies of text files next to them and records the
+# names in manifest.json. Templates link to static_url(path) and
+# bundle_urls(name), which point at the hashed files served from /assets/
+# with a one year immutable Cache-Control. Without a build, or with
+# ASSETS_DEBUG, they point at the source files in /static/ instead.
+#----------------------------------------------------------------------------#
+
+# Bundles linked from layouts/main.html, with their sources in order
+BUNDLES = {
+    "css/main.bundle.css": [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    "js/head.bundle.js": [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+        'js/script.js',
+    ],
+    "js/body.bundle.js": [
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+COMPRESSED_TYPES = ('.css', '.js', '.svg', '.map', '.ttf', '.eot', '.otf', '.json', '.txt')
+ONE_YEAR = 365 * 24 * 3600
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE_AROUND = re.compile(r'\s*([{};,>])\s*')
+
+
+def fingerprint(path, content):
+    """``path`` with a hash of ``content`` before its extension."""
+    root, extension = posixpath.splitext(path)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+
+
+def minify_css(css):
+    if rcssmin is not None:
+        return rcssmin.cssmin(css)
+    css = CSS_COMMENT.sub('', css)
+    css = re.sub(r'\s+', ' ', css)
+    return CSS_SPACE_AROUND.sub(r'\1', css).replace(';}', '}').strip()
+
+
+def minify_js(js):
+    # Without rjsmin scripts are only joined, most of them ship minified
+    if rjsmin is not None:
+        return rjsmin.jsmin(js)
+    return js.strip()
+
+
+def rewrite_css_urls(css, source, target, manifest):
+    """CSS of ``source`` moved to ``target``, its url()s pointing at hashed files."""
+    source_dir = posixpath.dirname(source)
+    target_dir = posixpath.dirname(target)
+
+    def replace(match):
+        url = match.group(2).strip()
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        resolved = posixpath.normpath(posixpath.join(source_dir, path))
+        if resolved not in manifest:
+            return match.group(0)
+        return f'url({posixpath.relpath(manifest[resolved], target_dir or ".")}{suffix})'
+
+    return CSS_URL.sub(replace, css)
+
+
+def build(source_dir, build_dir):
+    """Build the assets of ``source_dir`` into ``build_dir``, returning the manifest.
+
+    Files of previous builds are kept, pages cached or opened before a
+    deploy still link to them.
+    """
+    sources = list()
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != build_dir]
+        sources.extend(os.path.relpath(os.path.join(root, name), source_dir).replace(os.sep, '/')
+                       for name in files if not name.startswith('.'))
+
+    def read(path):
+        with open(os.path.join(source_dir, path), 'rb') as f:
+            return f.read()
+
+    def write(path, content):
+        hashed = fingerprint(path, content)
+        destination = os.path.join(build_dir, hashed)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with open(destination, 'wb') as f:
+            f.write(content)
+
+        if hashed.endswith(COMPRESSED_TYPES):
+            with open(destination + '.gz', 'wb') as f:
+                f.write(gzip.compress(content, compresslevel=9))
+            if brotli is not None:
+                with open(destination + '.br', 'wb') as f:
+                    f.write(brotli.compress(content))
+        manifest[path] = hashed
+
+    # Stylesheets last, their url()s point at the other files
+    manifest = dict()
+    for path in sorted(sources, key=lambda p: p.endswith('.css')):
+        if path.endswith('.css'):
+            css = read(path).decode('utf8')
+            write(path, rewrite_css_urls(css, path, path, manifest).encode('utf8'))
+        else:
+            write(path, read(path))
+
+    for name, members in BUNDLES.items():
+        if name.endswith('.css'):
+            content = '\n'.join(rewrite_css_urls(read(m).decode('utf8'), m, name, manifest)
+                                for m in members)
+            write(name, minify_css(content).encode('utf8'))
+        else:
+            content = '\n;\n'.join(read(m).decode('utf8') for m in members)
+            write(name, minify_js(content).encode('utf8'))
+
+    with open(os.path.join(build_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+#----------------------------------------------------------------------------#
+# Flask integration.
+#----------------------------------------------------------------------------#
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = dict()
+        self.build_dir = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.build_dir = app.config.get('ASSETS_BUILD_DIR') or os.path.join(app.static_folder, 'build')
+        self.manifest = dict()
+        manifest_path = os.path.join(self.build_dir, 'manifest.json')
+        if not app.config.get('ASSETS_DEBUG') and os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals.update(static_url=self.static_url, bundle_urls=self.bundle_urls)
+        app.cli.add_command(build_assets_command)
+
+    def static_url(self, filename):
+        """Like url_for('static', filename=...), to the hashed file once built."""
+        hashed = self.manifest.get(filename)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=hashed)
+
+    def bundle_urls(self, name):
+        """URLs to link for bundle ``name``, its sources until it is built."""
+        if name in self.manifest:
+            return [url_for('assets', filename=self.manifest[name])]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def serve(self, filename):
+        """A built file, precompressed when the client accepts it."""
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            path = safe_join(self.build_dir, filename + suffix)
+            if request.accept_encodings[candidate] and path and os.path.isfile(path):
+                encoding = candidate
+                filename += suffix
+                break
+
+        response = send_from_directory(self.build_dir, filename, mimetype=mimetype,
+                                       max_age=ONE_YEAR)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Fingerprint, bundle and precompress static/ into ASSETS_BUILD_DIR."""
+    started = time.perf_counter()
+    manifest = build(current_app.static_folder, assets.build_dir)
+    click.echo(f'Built {len(manifest)} assets in {time.perf_counter() - started:.1f}s '
+               f'into {assets.build_dir}.')
+    if brotli is None:
+        click.echo('brotli is not installed, only gzip copies were written.')
+    if rcssmin is None:
+        click.echo('rcssmin and rjsmin are not installed, scripts were bundled unminified.')
+
+
+assets = Assets()
@@ -0,0 +1,229 @@
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import func
+
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Name autocomplete.
+#
+# Venue and artist names are kept in memory by each process as a sorted
+# list of keys, one per word of each name ("the musical hop", "musical hop",
+# "hop"), so typing the start of any word finds the name, next to an array
+# of the id each key belongs to. A prefix is found by bisect and its matches
+# are the keys that follow it. Keys are normalized and cut to KEY_LENGTH
+# characters, and the keys many names share, such as their last words, are
+# stored once.
+#
+# The indexes are loaded in the background from the first request with
+# AUTOCOMPLETE_PRELOAD, or else on first use. The write handlers update
+# them as they save, and every AUTOCOMPLETE_SYNC_INTERVAL seconds a
+# background thread reads the rows updated since the last sync to pick up
+# the writes of other processes and imports. updated_at is set before the
+# write commits, so a transaction committing after a sync may carry an
+# older time: each sync reads back AUTOCOMPLETE_SYNC_OVERLAP seconds before
+# the latest time it saw, setting names again is harmless. An index is
+# reloaded when the number of rows shows some were deleted elsewhere.
+#----------------------------------------------------------------------------#
+
+MODELS = {"venues": Venue, "artists": Artist}
+
+# Typed prefixes longer than this match on their first KEY_LENGTH characters
+KEY_LENGTH = 24
+
+
+def normalize(text):
+    """``text`` casefolded, without accents and with single spaces."""
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.casefold().split())
+
+
+def keys_of(name):
+    words = normalize(name).split(' ')
+    return {' '.join(words[i:])[:KEY_LENGTH] for i in range(len(words)) if words[i]}
+
+
+class NameIndex:
+    """Sorted word keys of names, with the id of each in a parallel array."""
+
+    def __init__(self, rows=()):
+        self.names = {entity_id: sys.intern(name) for entity_id, name in sorted(rows)}
+
+        # One copy of each key, and its entries sorted by key then id: the
+        # sort is stable and the ids are listed in order
+        shared = dict()
+        keys, ids = list(), array('q')
+        for entity_id, name in self.names.items():
+            for key in keys_of(name):
+                keys.append(shared.setdefault(key, key))
+                ids.append(entity_id)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        self.ids = array('q', (ids[i] for i in order))
+        self.lock = threading.Lock()
+
+    def find(self, key, entity_id):
+        """Position of (key, entity_id) in the arrays, or where it would go."""
+        lo = bisect_left(self.keys, key)
+        hi = bisect_right(self.keys, key, lo)
+        return bisect_left(self.ids, entity_id, lo, hi)
+
+    def set(self, entity_id, name):
+        with self.lock:
+            old = self.names.get(entity_id)
+            if old == name:
+                return
+            if old is not None:
+                self._remove(entity_id)
+            for key in keys_of(name):
+                i = self.find(key, entity_id)
+                self.keys.insert(i, key)
+                self.ids.insert(i, entity_id)
+            self.names[entity_id] = sys.intern(name)
+
+    def remove(self, entity_id):
+        with self.lock:
+            self._remove(entity_id)
+
+    def _remove(self, entity_id):
+        name = self.names.pop(entity_id, None)
+        if name is None:
+            return
+        for key in keys_of(name):
+            i = self.find(key, entity_id)
+            if i < len(self.keys) and self.keys[i] == key and self.ids[i] == entity_id:
+                del self.keys[i]
+                del self.ids[i]
+
+    def search(self, prefix, limit):
+        """Up to ``limit`` names with a word starting with ``prefix``, by matching key."""
+        prefix = normalize(prefix)[:KEY_LENGTH]
+        if not prefix:
+            return list()
+
+        results, seen = list(), set()
+        with self.lock:
+            i = bisect_left(self.keys, prefix)
+            while i < len(self.keys) and len(results) < limit and self.keys[i].startswith(prefix):
+                entity_id = self.ids[i]
+                if entity_id not in seen:
+                    seen.add(entity_id)
+                    results.append({"id": entity_id, "name": self.names[entity_id]})
+                i += 1
+        return results
+
+
+class Autocomplete:
+    def __init__(self, app=None):
+        self.indexes = dict()
+        self.synced_at = dict()
+        self.checked_at = dict()
+        self.lock = threading.Lock()
+        self.syncing = set()
+        self.preloading = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.indexes = dict()
+        self.interval = app.config.get('AUTOCOMPLETE_SYNC_INTERVAL', 30)
+        self.overlap = timedelta(seconds=app.config.get('AUTOCOMPLETE_SYNC_OVERLAP', 300))
+        if app.config.get('AUTOCOMPLETE_PRELOAD'):
+            app.before_request(self.preload)
+
+    def preload(self):
+        """Start loading the indexes in the background on the first request."""
+        if not self.preloading:
+            self.preloading = True
+            threading.Thread(target=self.load_in_context, daemon=True,
+                             args=(current_app._get_current_object(),)).start()
+
+    def load_in_context(self, app):
+        try:
+            with app.app_context(), self.lock:
+                for kind in MODELS:
+                    if kind not in self.indexes:
+                        self.load(kind)
+                db.session.remove()
+        except Exception:
+            app.logger.exception('Could not load the autocomplete indexes.')
+
+    def index(self, kind):
+        """The index of ``kind``, loaded on first use and synced in the background."""
+        index = self.indexes.get(kind)
+        if index is None:
+            with self.lock:
+                index = self.indexes.get(kind)
+                if index is None:
+                    index = self.load(kind)
+        elif time.monotonic() - self.checked_at[kind] > self.interval and kind not in self.syncing:
+            self.syncing.add(kind)
+            threading.Thread(target=self.sync_in_context, daemon=True,
+                             args=(current_app._get_current_object(), kind)).start()
+        return index
+
+    def load(self, kind):
+        model = MODELS[kind]
+        started = time.monotonic()
+        synced_at = db.session.query(func.max(model.updated_at)).scalar()
+        rows = db.session.query(model.id, model.name).yield_per(10000)
+        index = self.indexes[kind] = NameIndex(list(rows))
+        self.synced_at[kind] = synced_at
+        self.checked_at[kind] = started
+        return index
+
+    def sync_in_context(self, app, kind):
+        try:
+            with app.app_context():
+                self.sync(kind)
+                db.session.remove()
+        except Exception:
+            app.logger.exception(f'Could not sync the {kind} autocomplete index.')
+            self.checked_at[kind] = time.monotonic()
+        finally:
+            self.syncing.discard(kind)
+
+    def sync(self, kind):
+        """Apply the names of rows updated since the last sync, or reload."""
+        model = MODELS[kind]
+        index = self.indexes[kind]
+        started = time.monotonic()
+
+        changed = db.session.query(model.id, model.name, model.updated_at)
+        if self.synced_at[kind] is not None:
+            changed = changed.filter(model.updated_at >= self.synced_at[kind] - self.overlap)
+        for entity_id, name, updated_at in changed:
+            index.set(entity_id, name)
+            if self.synced_at[kind] is None or updated_at > self.synced_at[kind]:
+                self.synced_at[kind] = updated_at
+
+        if db.session.query(func.count(model.id)).scalar() != len(index.names):
+            with self.lock:
+                self.load(kind)
+        self.checked_at[kind] = started
+
+    def search(self, kind, prefix, limit):
+        return self.index(kind).search(prefix, limit)
+
+    def set(self, kind, entity_id, name):
+        """Add or rename one venue or artist, if its index is loaded."""
+        index = self.indexes.get(kind)
+        if index is not None:
+            index.set(entity_id, name)
+
+    def remove(self, kind, entity_id):
+        index = self.indexes.get(kind)
+        if index is not None:
+            index.remove(entity_id)
+
+
+autocomplete = Autocomplete()
@@ -0,0 +1,580 @@
+import asyncio
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import quote, urlencode, urlsplit
+
+import babel.dates
+import click
+import dateutil.parser
+
+from app import app
+from autocomplete import NameIndex
+from cache import cache
+from config import engine_options
+from counters import refresh_counters
+from enums import Genre
+from filters import format_datetime, format_in
+import geo
+from importer import write_rows, reset_sequence
+from instrumentation import instrumentation
+from models import db, Show, Venue, Artist, VenueGenre, ArtistGenre
+from partitions import is_partitioned, partition_show_table
+
+#----------------------------------------------------------------------------#
+# Benchmarks.
+#
+# Seeds a synthetic catalog, then requests every page and API route through
+# the Flask test client from concurrent threads and reports latency
+# percentiles and queries per request. Reports are written as JSON so a run
+# can be compared against a baseline, e.g. before deploying:
+#
+#   python benchmark.py --scale medium --output baseline.json
+#   python benchmark.py --scale medium --compare baseline.json
+#
+# On PostgreSQL, --partitioned partitions Show by month like the migrations
+# do, e.g. to compare time window queries over years of past shows:
+#
+#   python benchmark.py --database-uri postgresql:///bench --scale large --history-years 5 \
+#       --reseed --route shows_window --route venue --output plain.json
+#   python benchmark.py --database-uri postgresql:///bench --scale large --history-years 5 \
+#       --partitioned --route shows_window --route venue --compare plain.json
+#
+# With --url the same routes are requested over HTTP from a running server,
+# each concurrent client holding its own keep-alive connection, to compare
+# serving modes at hundreds of connections:
+#
+#   gunicorn -w 4 --threads 32 app:app
+#   python benchmark.py --url http://localhost:8000 --concurrency 500 --output wsgi.json
+#   uvicorn --workers 4 asgi:asgi_app
+#   python benchmark.py --url http://localhost:8000 --concurrency 500 --compare wsgi.json
+#
+# --micro times hot helpers on their own instead, see Micro-benchmarks.
+#----------------------------------------------------------------------------#
+
+SCALES = {
+    "small": (1000, 1000, 10000),
+    "medium": (10000, 10000, 100000),
+    "large": (100000, 100000, 1000000),
+}
+
+BATCH_SIZE = 10000
+
+WORDS = ['Blue', 'Note', 'Hall', 'Park', 'Square', 'Musical', 'Hop', 'Dueling', 'Pianos',
+         'Room', 'Garden', 'House', 'Club', 'Lounge', 'Velvet', 'Echo', 'Stone', 'River',
+         'Golden', 'Sound', 'Theatre', 'Cellar', 'Petals', 'Guns', 'Wild', 'Sax', 'Band']
+
+# Venues are at the center of their city, as a gazetteer locates them (see
+# geo.locate), and nearby searches are spread around it
+CITIES = {('San Francisco', 'CA'): (37.7749, -122.4194), ('New York', 'NY'): (40.7128, -74.0060),
+          ('Austin', 'TX'): (30.2672, -97.7431), ('Chicago', 'IL'): (41.8781, -87.6298),
+          ('Seattle', 'WA'): (47.6062, -122.3321), ('Nashville', 'TN'): (36.1627, -86.7816),
+          ('New Orleans', 'LA'): (29.9511, -90.0715), ('Denver', 'CO'): (39.7392, -104.9903),
+          ('Boston', 'MA'): (42.3601, -71.0589), ('Miami', 'FL'): (25.7617, -80.1918)}
+CITY_SPREAD = 0.15
+
+GENRES = [g.value for g in Genre]
+
+# (name, method, path, form data). Paths and data are formatted with a random
+# venue_id, artist_id, genre, search word and its first letters, month long
+# window of dates within the coming year and point near a city for every
+# request.
+ROUTES = [
+    ('index', 'GET', '/', None),
+    ('venues', 'GET', '/venues', None),
+    ('venues_by_genre', 'GET', '/venues?genre={genre}', None),
+    ('venue', 'GET', '/venues/{venue_id}', None),
+    ('venue_create', 'GET', '/venues/create', None),
+    ('venue_edit', 'GET', '/venues/{venue_id}/edit', None),
+    ('venue_delete', 'GET', '/venues/{venue_id}/delete', None),
+    ('search_venues', 'POST', '/venues/search', {"search_term": '{word}'}),
+    ('artists', 'GET', '/artists', None),
+    ('artists_by_genre', 'GET', '/artists?genre={genre}', None),
+    ('artist', 'GET', '/artists/{artist_id}', None),
+    ('artist_create', 'GET', '/artists/create', None),
+    ('artist_edit', 'GET', '/artists/{artist_id}/edit', None),
+    ('artist_delete', 'GET', '/artists/{artist_id}/delete', None),
+    ('search_artists', 'POST', '/artists/search', {"search_term": '{word}'}),
+    ('shows', 'GET', '/shows', None),
+    ('shows_window', 'GET', '/shows?from={window_start}&to={window_end}', None),
+    ('show_create', 'GET', '/shows/create', None),
+    ('api_venues', 'GET', '/api/v1/venues', None),
+    ('api_venue', 'GET', '/api/v1/venues/{venue_id}', None),
+    ('api_venues_nearby', 'GET', '/api/v1/venues/nearby?lat={lat}&lng={lng}', None),
+    ('api_autocomplete', 'GET', '/api/v1/autocomplete?q={prefix}', None),
+    ('api_search_venues', 'GET', '/api/v1/venues/search?search_term={word}', None),
+    ('api_artists', 'GET', '/api/v1/artists', None),
+    ('api_artist', 'GET', '/api/v1/artists/{artist_id}', None),
+    ('api_search_artists', 'GET', '/api/v1/artists/search?search_term={word}', None),
+    ('api_shows', 'GET', '/api/v1/shows', None),
+    ('api_shows_window', 'GET', '/api/v1/shows?from={window_start}&to={window_end}&genre={genre}', None),
+]
+
+# Endpoints that are not benchmarked: write handlers, which would change the
+# catalog between runs, and bulk exports, whose cost is the size of the table.
+SKIPPED_ENDPOINTS = {'static', 'assets', 'metrics', 'export'}
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+
+def fake_name(rng):
+    return ' '.join(rng.sample(WORDS, rng.randint(2, 3)))
+
+
+def write_batches(table, rows):
+    batch = list()
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            write_rows(table, batch)
+            batch = list()
+    write_rows(table, batch)
+
+
+def seed(venues, artists, shows, rng, history_years=2):
+    """Insert a catalog of the given size into empty tables.
+
+    Show start times spread from ``history_years`` ago to a year from now.
+    """
+    for model, genre_model, key, count in ((Venue, VenueGenre, 'venue_id', venues),
+                                           (Artist, ArtistGenre, 'artist_id', artists)):
+        entities = list()
+        for i in range(1, count + 1):
+            city, state = rng.choice(list(CITIES))
+            entity = {"id": i, "name": fake_name(rng), "city": city, "state": state,
+                      "phone": f'555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}',
+                      "image_link": f'https://images.example.com/{model.__tablename__}/{i}.jpg'}
+            if model is Venue:
+                entity["address"] = f'{rng.randint(1, 999)} {rng.choice(WORDS)} Street'
+                latitude, longitude = CITIES[(city, state)]
+                entity.update(latitude=latitude, longitude=longitude,
+                              geohash=geo.encode(latitude, longitude))
+            entities.append(entity)
+        write_batches(model.__table__, entities)
+        write_batches(genre_model.__table__, (
+            {key: i, "genre": genre}
+            for i in range(1, count + 1) for genre in rng.sample(GENRES, rng.randint(1, 3))))
+        reset_sequence(model)
+
+    now = datetime.now()
+    write_batches(Show, (
+        {"venue_id": rng.randint(1, venues), "artist_id": rng.randint(1, artists),
+         "start_time": now + timedelta(minutes=rng.randint(-history_years * 365 * 24 * 60, 365 * 24 * 60))}
+        for _ in range(shows)))
+
+    refresh_counters(Venue, Show.c.venue_id)
+    refresh_counters(Artist, Show.c.artist_id)
+    db.session.commit()
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute('ANALYZE')
+        db.session.commit()
+
+
+def prepare_database(venues, artists, shows, reseed, history_years=2, partitioned=False):
+    """Seed the benchmark database unless it already holds this catalog.
+
+    With ``partitioned``, Show is then partitioned by month (PostgreSQL).
+    """
+    engine = db.get_engine()
+    if engine.has_table('Venue'):
+        counts = tuple(db.session.query(db.func.count()).select_from(t).scalar()
+                       for t in (Venue.__table__, Artist.__table__, Show))
+        if counts == (venues, artists, shows) and not reseed:
+            click.echo(f'Reusing {venues} venues, {artists} artists and {shows} shows.')
+            partition(engine, partitioned)
+            return
+        if any(counts) and not reseed:
+            raise click.ClickException(
+                f'The database holds {counts[0]} venues, {counts[1]} artists and {counts[2]} '
+                'shows. Pass --reseed to drop every table and seed it again.')
+
+    if engine.dialect.name == 'postgresql':
+        db.session.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        db.session.commit()
+    db.drop_all()
+    db.create_all()
+
+    click.echo(f'Seeding {venues} venues, {artists} artists and {shows} shows...')
+    started = time.perf_counter()
+    seed(venues, artists, shows, random.Random(0), history_years)
+    click.echo(f'Seeded in {time.perf_counter() - started:.1f}s.')
+    partition(engine, partitioned)
+
+
+def partition(engine, partitioned):
+    if engine.dialect.name != 'postgresql':
+        if partitioned:
+            raise click.ClickException('--partitioned needs a PostgreSQL database.')
+        return
+
+    connection = db.session.connection()
+    if is_partitioned(connection) == partitioned:
+        return
+    if not partitioned:
+        raise click.ClickException('Show is partitioned, pass --partitioned or --reseed.')
+
+    click.echo('Partitioning Show by month...')
+    partition_show_table(connection)
+    db.session.commit()
+
+#----------------------------------------------------------------------------#
+# Load driver.
+#----------------------------------------------------------------------------#
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted ``values``."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(samples, wall_time):
+    latencies = sorted(elapsed for elapsed, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    return {
+        "requests": len(samples),
+        "errors": sum(status >= 400 for _, _, status in samples),
+        "throughput": round(len(samples) / wall_time, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        **{f'p{p}_ms': round(percentile(latencies, p) * 1000, 2) for p in (50, 90, 95, 99)},
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "queries_mean": round(sum(queries) / len(queries), 2),
+        "queries_max": max(queries),
+    }
+
+
+def make_request(route, rng, venues, artists):
+    _, method, path, data = route
+    window_start = datetime.now().date() + timedelta(days=rng.randint(0, 335))
+    latitude, longitude = rng.choice(list(CITIES.values()))
+    values = {"venue_id": rng.randint(1, venues), "artist_id": rng.randint(1, artists),
+              "genre": rng.choice(GENRES), "word": rng.choice(WORDS),
+              "prefix": rng.choice(WORDS)[:rng.randint(1, 4)],
+              "window_start": window_start.isoformat(),
+              "window_end": (window_start + timedelta(days=30)).isoformat(),
+              "lat": round(latitude + rng.gauss(0, CITY_SPREAD), 4),
+              "lng": round(longitude + rng.gauss(0, CITY_SPREAD), 4)}
+    return method, path.format(**values), {k: v.format(**values) for k, v in (data or {}).items()}
+
+
+def run_route(route, requests, concurrency, warmup, venues, artists):
+    def worker(count, seed_value):
+        client = app.test_client()
+        rng = random.Random(seed_value)
+        samples = list()
+        for _ in range(count):
+            method, path, data = make_request(route, rng, venues, artists)
+            started = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            elapsed = time.perf_counter() - started
+            samples.append((elapsed, int(response.headers.get('X-Query-Count', 0)), response.status_code))
+        return samples
+
+    worker(warmup, -1)
+
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(worker, shares, range(concurrency)))
+    wall_time = time.perf_counter() - started
+
+    return summarize([s for samples in results for s in samples], wall_time)
+
+
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client, enough to drive the app's routes."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, data):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        body = urlencode(data).encode() if data else b''
+        head = (f'{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+                f'Content-Length: {len(body)}\r\n')
+        if data:
+            head += 'Content-Type: application/x-www-form-urlencoded\r\n'
+        self.writer.write((head + '\r\n').encode('latin1') + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = dict()
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.read()
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, headers
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def run_route_http(route, url, requests, concurrency, warmup, venues, artists):
+    """Like run_route, over HTTP against the server at ``url``."""
+    target = urlsplit(url)
+    prefix = target.path.rstrip('/')
+
+    async def client(count, seed_value, samples):
+        connection = HTTPConnection(target.hostname, target.port or 80)
+        rng = random.Random(seed_value)
+        for _ in range(count):
+            method, path, data = make_request(route, rng, venues, artists)
+            started = time.perf_counter()
+            try:
+                status, headers = await connection.request(method, prefix + quote(path, safe='/?='), data)
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                connection.close()
+                status, headers = 599, dict()
+            elapsed = time.perf_counter() - started
+            samples.append((elapsed, int(headers.get('x-query-count', 0)), status))
+        connection.close()
+
+    async def drive():
+        await client(warmup, -1, list())
+
+        samples = list()
+        shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+        started = time.perf_counter()
+        await asyncio.gather(*[client(share, i, samples) for i, share in enumerate(shares)])
+        return samples, time.perf_counter() - started
+
+    samples, wall_time = asyncio.run(drive())
+    return summarize(samples, wall_time)
+
+
+def uncovered_endpoints():
+    """GET endpoints of the app that no benchmarked route reaches."""
+    adapter = app.url_map.bind('localhost')
+    covered = {adapter.match(path.split('?')[0].format(venue_id=1, artist_id=1), method)[0]
+               for _, method, path, _ in ROUTES}
+    return sorted({rule.endpoint for rule in app.url_map.iter_rules() if 'GET' in rule.methods}
+                  - covered - SKIPPED_ENDPOINTS)
+
+#----------------------------------------------------------------------------#
+# Reports.
+#----------------------------------------------------------------------------#
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None, threshold=0.2):
+    """Print the routes of ``report`` and return those that regressed.
+
+    With a ``threshold`` of None only the queries per request are compared.
+    """
+    regressions = list()
+    click.echo(f'{"route":<20} {"req/s":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"q/req":>6}'
+               + (f' {"base p95":>9} {"change":>7}' if baseline else ''))
+
+    for name, result in report["routes"].items():
+        line = (f'{name:<20} {result["throughput"]:>8} {result["p50_ms"]:>8} {result["p95_ms"]:>8} '
+                f'{result["p99_ms"]:>8} {result["queries_mean"]:>6}')
+
+        base = (baseline or {}).get("routes", {}).get(name)
+        if base:
+            change = result["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0
+            line += f' {base["p95_ms"]:>9} {change:>+7.0%}'
+            slower = threshold is not None and change > threshold
+            if slower or result["queries_mean"] > base["queries_mean"]:
+                regressions.append(name)
+                line += '  REGRESSION'
+        if result["errors"]:
+            line += f'  {result["errors"]} errors'
+        click.echo(line)
+
+    return regressions
+
+#----------------------------------------------------------------------------#
+# Micro-benchmarks.
+#----------------------------------------------------------------------------#
+
+
+def time_per_call(function, values):
+    """Mean microseconds of ``function`` over ``values``."""
+    started = time.perf_counter()
+    for value in values:
+        function(value)
+    return (time.perf_counter() - started) / len(values) * 1e6
+
+
+def benchmark_datetime_filter(calls=5000):
+    """Per call cost of the datetime filter, as used by the show tiles."""
+    rng = random.Random(0)
+    values = [datetime(2026, 1, 1) + timedelta(minutes=30 * i)
+              for i in rng.sample(range(calls * 10), calls)]
+
+    def before(value):
+        # The filter before filters.py: parse the value, then the pattern
+        date = dateutil.parser.parse(str(value))
+        return babel.dates.format_datetime(date, "EEEE MMMM, d, y 'at' h:mma")
+
+    def full(value):
+        return format_datetime(value, 'full')
+
+    results = dict()
+    with app.test_request_context('/'):
+        results["string parsing and babel (before)"] = time_per_call(before, values)
+        format_in.cache_clear()
+        results["filter, first call"] = time_per_call(full, values)
+        results["filter, memoized"] = time_per_call(full, values)
+
+    data_timezone = app.config['DATA_TIMEZONE']
+    app.config['DATA_TIMEZONE'] = 'UTC'
+    with app.test_request_context('/', headers={"Cookie": 'timezone=America/New_York'}):
+        format_in.cache_clear()
+        results["filter, viewer timezone"] = time_per_call(full, values)
+    app.config['DATA_TIMEZONE'] = data_timezone
+    return results
+
+
+def benchmark_autocomplete(names=1000000, calls=5000):
+    """Mean and p99 cost of an autocomplete search among ``names`` names."""
+    rng = random.Random(0)
+    index = NameIndex((i, f'{fake_name(rng)} {rng.choice(WORDS)}{i}') for i in range(1, names + 1))
+    prefixes = [rng.choice(WORDS)[:rng.randint(1, 4)] for _ in range(calls)]
+
+    latencies = list()
+    for prefix in prefixes:
+        started = time.perf_counter()
+        index.search(prefix, 10)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        f"autocomplete among {names} names": sum(latencies) / calls * 1e6,
+        f"autocomplete among {names} names, p99": percentile(latencies, 99) * 1e6,
+    }
+
+
+@click.command()
+@click.option('--database-uri',
+              help='Database to seed and benchmark against, never the one in config.py. '
+                   'sqlite:///benchmark.db by default, nothing is seeded with --url unless given.')
+@click.option('--url', help='Benchmark the server running at this URL instead of the test client.')
+@click.option('--scale', type=click.Choice(list(SCALES)), default='small', show_default=True,
+              help='Preset catalog size: 10k, 100k or 1M shows.')
+@click.option('--venues', type=int, help='Venues to seed, overrides --scale.')
+@click.option('--artists', type=int, help='Artists to seed, overrides --scale.')
+@click.option('--shows', type=int, help='Shows to seed, overrides --scale.')
+@click.option('--reseed', is_flag=True, help='Drop every table and seed again.')
+@click.option('--history-years', default=2, show_default=True,
+              help='Years of past shows to seed, next to a year of upcoming ones.')
+@click.option('--partitioned', is_flag=True, help='Partition Show by month, as migrations do on PostgreSQL.')
+@click.option('--requests', default=200, show_default=True, help='Requests per route.')
+@click.option('--concurrency', default=4, show_default=True, help='Concurrent clients.')
+@click.option('--warmup', default=5, show_default=True, help='Unmeasured requests per route.')
+@click.option('--route', 'only', multiple=True, help='Only benchmark these routes.')
+@click.option('--cache', 'use_cache', is_flag=True, help='Keep the page and view data cache on.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the report to this JSON file.')
+@click.option('--compare', type=click.File(), help='Baseline report to compare against.')
+@click.option('--threshold', default=0.2, show_default=True,
+              help='p95 slowdown, as a fraction of the baseline, counted as a regression.')
+@click.option('--queries-only', is_flag=True,
+              help='Only count more queries per request as a regression, not slower routes.')
+@click.option('--micro', is_flag=True, help='Run the micro-benchmarks instead of the routes.')
+def main(database_uri, url, scale, venues, artists, shows, reseed, history_years, partitioned,
+         requests, concurrency, warmup, only, use_cache, output, compare, threshold, queries_only, micro):
+    """Benchmark every route on a synthetic catalog.
+
+    Exits with status 1 when compared to a baseline and a route's p95
+    latency grew by more than the threshold or it issues more queries.
+    """
+    if micro:
+        for name, cost in {**benchmark_datetime_filter(), **benchmark_autocomplete()}.items():
+            click.echo(f'{name:<40} {cost:>8.1f} us/call')
+        return
+
+    venues = venues or SCALES[scale][0]
+    artists = artists or SCALES[scale][1]
+    shows = shows or SCALES[scale][2]
+
+    dialect = None
+    if database_uri or not url:
+        database_uri = database_uri or 'sqlite:///benchmark.db'
+        app.config.update(SQLALCHEMY_DATABASE_URI=database_uri, WTF_CSRF_ENABLED=False,
+                          SQLALCHEMY_ENGINE_OPTIONS=engine_options(database_uri, app.config),
+                          CACHE_TYPE=app.config['CACHE_TYPE'] if use_cache else 'null')
+        cache.init_app(app)
+        instrumentation.debug_headers = True
+
+        with app.app_context():
+            prepare_database(venues, artists, shows, reseed, history_years, partitioned)
+            dialect = db.get_engine().dialect.name
+
+    routes = [r for r in ROUTES if not only or r[0] in only]
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "target": url or 'test client',
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "database": dialect,
+            "venues": venues, "artists": artists, "shows": shows,
+            "history_years": history_years, "partitioned": partitioned,
+            "requests": requests, "concurrency": concurrency, "cache": use_cache,
+        },
+        "routes": dict(),
+    }
+    for route in routes:
+        click.echo(f'{route[0]}...', nl=False, err=True)
+        if url:
+            result = run_route_http(route, url, requests, concurrency, warmup, venues, artists)
+        else:
+            result = run_route(route, requests, concurrency, warmup, venues, artists)
+        report["routes"][route[0]] = result
+        click.echo(' done', err=True)
+
+    baseline = json.load(compare) if compare else None
+    if baseline and baseline["meta"]["shows"] != shows:
+        click.echo('Warning: the baseline was measured on a catalog of another size.', err=True)
+    regressions = print_report(report, baseline, None if queries_only else threshold)
+
+    uncovered = uncovered_endpoints()
+    if uncovered and not only:
+        click.echo(f'Not benchmarked: {", ".join(uncovered)}', err=True)
+
+    if output:
+        with open(output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+    if regressions:
+        raise click.ClickException(f'{len(regressions)} routes regressed: {", ".join(regressions)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, make_response, request, session
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+#----------------------------------------------------------------------------#
+# Backends.
+#
+# Every entry is stored with a set of tags ('venues', 'venue:3', ...) and the
+# write handlers invalidate the tags they affect. Entries also expire after a
+# TTL, which bounds staleness for changes no handler knows about, such as
+# shows moving from upcoming to past as time passes.
+#----------------------------------------------------------------------------#
+
+MISSING = object()
+
+
+def entry_size(value):
+    """Bytes of ``value``, nested view data counted as its pickle, as Redis stores it."""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+class LRUCache:
+    """In-process LRU cache bounded by entry count and approximate size."""
+
+    def __init__(self, ttl=300, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.tags = dict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return MISSING
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags=()):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+            size = entry_size(value)
+            if size > self.max_bytes:
+                return
+
+            self.entries[key] = (time.monotonic() + self.ttl, value, tuple(tags), size)
+            self.size += size
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, *tags):
+        with self.lock:
+            for tag in tags:
+                for key in self.tags.pop(tag, set()):
+                    if key in self.entries:
+                        self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        _, _, tags, size = self.entries.pop(key)
+        self.size -= size
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
+class RedisCache:
+    """Cache shared by all processes through a Redis-compatible server.
+
+    Memory is bounded by the server's maxmemory policy, tags are kept as
+    sets that expire together with the entries they point to.
+    """
+
+    def __init__(self, url, ttl=300, prefix='fyyur:'):
+        if redis is None:
+            raise RuntimeError('CACHE_TYPE "redis" needs the redis package installed.')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+            return MISSING
+
+        self.hits += 1
+        return pickle.loads(value)
+
+    def set(self, key, value, tags=()):
+        pipe = self.client.pipeline()
+        pipe.setex(self.prefix + key, self.ttl, pickle.dumps(value))
+        for tag in tags:
+            pipe.sadd(self.prefix + 'tag:' + tag, self.prefix + key)
+            pipe.expire(self.prefix + 'tag:' + tag, self.ttl)
+        pipe.execute()
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            keys = self.client.smembers(tag_key)
+            self.client.delete(tag_key, *keys)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class NullCache:
+    hits = 0
+    misses = 0
+
+    def get(self, key):
+        return MISSING
+
+    def set(self, key, value, tags=()):
+        pass
+
+    def invalidate(self, *tags):
+        pass
+
+    def clear(self):
+        pass
+
+#----------------------------------------------------------------------------#
+# Flask integration.
+#----------------------------------------------------------------------------#
+
+
+class Cache:
+    """Cache configured by the app settings starting with ``config_prefix``."""
+
+    def __init__(self, app=None, config_prefix='CACHE_'):
+        self.backend = NullCache()
+        self.config_prefix = config_prefix
+        self.variants = list()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        def setting(name, default=None):
+            return app.config.get(self.config_prefix + name, default)
+
+        cache_type = setting('TYPE', 'simple')
+        ttl = setting('DEFAULT_TIMEOUT', 300)
+        if cache_type == 'simple':
+            self.backend = LRUCache(ttl, setting('MAX_ENTRIES', 1024),
+                                    setting('MAX_BYTES', 64 * 1024 * 1024))
+        elif cache_type == 'redis':
+            self.backend = RedisCache(setting('REDIS_URL'), ttl)
+        else:
+            self.backend = NullCache()
+
+    def stats(self):
+        return {"hits": self.backend.hits, "misses": self.backend.misses}
+
+    def get_or_set(self, key, create, tags=()):
+        """Cached value of ``key``, calling ``create`` to build it on a miss.
+
+        ``tags`` may be a function of the value. They are also added to the
+        page being rendered, so a cached page is invalidated together with
+        the view data it was built from.
+        """
+        value = self.backend.get(key)
+        missing = value is MISSING
+        if missing:
+            value = create()
+
+        value_tags = tags(value) if callable(tags) else tags
+        if missing:
+            self.backend.set(key, value, value_tags)
+
+        self.tag(*value_tags)
+        return value
+
+    def invalidate(self, *tags):
+        self.backend.invalidate(*tags)
+
+    def clear(self):
+        self.backend.clear()
+
+    def tag(self, *tags):
+        """Add tags to the page being rendered by a ``cached_page`` view."""
+        if 'cache_tags' in g:
+            g.cache_tags.update(tags)
+
+    def vary(self, variant):
+        """Cache pages separately for each value of ``variant()``, e.g. a locale."""
+        self.variants.append(variant)
+
+    def cached_page(self, *tags):
+        """Cache the rendered page of a GET view.
+
+        ``tags`` may refer to the view arguments, e.g. 'venue:{venue_id}'.
+        Pages are not cached while flashed messages are waiting to be shown.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if request.method != 'GET' or session.get('_flashes'):
+                    return view(**kwargs)
+
+                key = 'page:' + request.full_path
+                for variant in self.variants:
+                    key += f':{variant()}'
+                page = self.backend.get(key)
+                status = 'HIT'
+                if page is MISSING:
+                    g.cache_tags = {tag.format(**kwargs) for tag in tags}
+                    page = view(**kwargs)
+                    if isinstance(page, str):
+                        self.backend.set(key, page, g.cache_tags)
+                    status = 'MISS'
+
+                response = make_response(page)
+                response.headers['X-Cache'] = status
+                return response
+            return wrapper
+        return decorator
+
+
+cache = Cache()
+fragment_cache = Cache(config_prefix='FRAGMENT_CACHE_')
@@ -1,13 +1,229 @@
 import os
-SECRET_KEY = os.urandom(32)
+
+from instrumentation import InstrumentedQueuePool
+
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+#----------------------------------------------------------------------------#
+# Configuration is picked by the FYYUR_ENV environment variable
+# (development, testing or production, development by default) and the
+# database settings may be overridden with environment variables.
+#----------------------------------------------------------------------------#
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_list(name):
+    return [value.strip() for value in os.environ.get(name, '').split(',') if value.strip()]
+
+
+def engine_options(uri, settings):
+    """SQLAlchemy engine options for ``uri`` from the DB_* ``settings``.
+
+    SQLite gets the driver defaults, it has no connection pool to tune.
+    """
+    if uri.startswith('sqlite'):
+        return dict()
+
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings['DB_POOL_SIZE'],
+        "max_overflow": settings['DB_MAX_OVERFLOW'],
+        "pool_timeout": settings['DB_POOL_TIMEOUT'],
+        "pool_recycle": settings['DB_POOL_RECYCLE'],
+        "pool_pre_ping": settings['DB_POOL_PRE_PING'],
+    }
+    if settings['DB_STATEMENT_TIMEOUT'] and uri.startswith('postgresql'):
+        options["connect_args"] = {
+            "options": f'-c statement_timeout={settings["DB_STATEMENT_TIMEOUT"]}'}
+    return options
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
+    DEBUG = False
+
+    # Connect to the database
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL', 'postgresql://<database-user>:<password>@localhost:5432/fyyur')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connections kept in the pool and opened beyond it under load, seconds to
+    # wait for a free one, seconds after which connections are replaced, and
+    # whether they are tested before use
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 5)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 10)
+    DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', 30)
+    DB_POOL_RECYCLE = env_int('DB_POOL_RECYCLE', 1800)
+    DB_POOL_PRE_PING = True
+    # Milliseconds after which PostgreSQL cancels a statement, 0 to disable
+    DB_STATEMENT_TIMEOUT = env_int('DB_STATEMENT_TIMEOUT', 0)
+
+    # Comma separated URIs of read replicas of SQLALCHEMY_DATABASE_URI. GET
+    # requests and searches read from them, a replica is probed every
+    # REPLICA_CHECK_INTERVAL seconds and skipped for REPLICA_RETRY_INTERVAL
+    # seconds once it fails, and a client reads from the primary for
+    # REPLICA_STICKY_SECONDS after a write so it sees its own changes.
+    READ_REPLICA_URIS = env_list('READ_REPLICA_URIS')
+    REPLICA_CHECK_INTERVAL = 10
+    REPLICA_RETRY_INTERVAL = 30
+    REPLICA_STICKY_SECONDS = env_int('REPLICA_STICKY_SECONDS', 5)
+
+    @property
+    def SQLALCHEMY_ENGINE_OPTIONS(self):
+        return engine_options(self.SQLALCHEMY_DATABASE_URI, {
+            key: getattr(self, key) for key in dir(self) if key.startswith('DB_')})
+
+    # Maximum number of ranked rows returned by the venue and artist searches
+    SEARCH_RESULTS_LIMIT = 50
+
+    # Shortest search term, as the trigram indexes cannot serve shorter ones,
+    # and the number of matches at which the searches stop counting
+    SEARCH_MIN_LENGTH = 3
+    SEARCH_COUNT_LIMIT = 1000
+
+    # Default and maximum number of rows per page on the venues, artists and
+    # shows listings
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+
+    # Number of past and upcoming shows listed on a venue or artist page before
+    # "Load more" is needed
+    SHOW_LIST_SIZE = 12
+
+    # Recommendations stored per artist and per venue, the share of their
+    # score given to matching genres rather than co-bookings, and the rows
+    # scored at once by `flask compute-recommendations`, see recommend.py
+    RECOMMENDATION_COUNT = 6
+    RECOMMENDATION_GENRE_WEIGHT = 0.5
+    RECOMMENDATION_BLOCK_SIZE = 256
+
+    # Default and largest number of names of each kind an autocomplete answers
+    # with, seconds between the syncs of the in-memory name indexes with the
+    # database, which pick up the writes of other processes, seconds each sync
+    # reads back for transactions that committed late (longer than the
+    # longest import batch), and whether the indexes are loaded as soon as
+    # the app serves rather than on first use
+    AUTOCOMPLETE_LIMIT = 10
+    AUTOCOMPLETE_MAX_LIMIT = 50
+    AUTOCOMPLETE_SYNC_INTERVAL = env_int('AUTOCOMPLETE_SYNC_INTERVAL', 30)
+    AUTOCOMPLETE_SYNC_OVERLAP = env_int('AUTOCOMPLETE_SYNC_OVERLAP', 300)
+    AUTOCOMPLETE_PRELOAD = True
+
+    # Gazetteer file venues are located from by city, see geo.py, and the
+    # default and largest radius in miles and number of venues of a nearby
+    # venues search
+    GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH')
+    NEARBY_RADIUS = 25
+    NEARBY_MAX_RADIUS = 500
+    NEARBY_LIMIT = 20
+    NEARBY_MAX_LIMIT = 100
+
+    # Minutes a show books its venue and artist for, so shows of the same
+    # venue or artist must start at least this far apart, and the most shows
+    # accepted by one bulk scheduling request
+    SHOW_DURATION = env_int('SHOW_DURATION', 180)
+    SCHEDULE_MAX_SHOWS = 1000
+
+    # Worker threads issuing the independent queries of a venue or artist page
+    # at the same time, each on its own connection and so its own snapshot:
+    # a page may then count a show its lists miss. Below 2 they run in turn.
+    DETAIL_QUERY_WORKERS = env_int('DETAIL_QUERY_WORKERS', 0)
+
+    # Threads running requests in the ASGI serving mode (asgi.py), per process.
+    # By default the connections DB_POOL_SIZE + DB_MAX_OVERFLOW leave beside
+    # the DETAIL_QUERY_WORKERS, and asgi.py refuses to start with more.
+    ASGI_THREADS = env_int('ASGI_THREADS', 0)
+
+    # Cache for rendered pages and view data, invalidated by the write handlers.
+    # "simple" keeps a per-process LRU, "redis" shares entries between processes
+    # through CACHE_REDIS_URL and "null" disables caching.
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'simple')
+    CACHE_DEFAULT_TIMEOUT = 300
+    CACHE_MAX_ENTRIES = 1024
+    CACHE_MAX_BYTES = 64 * 1024 * 1024
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+    # Locales dates are shown in, picked from the viewer's Accept-Language, the
+    # first one by default, and the timezone of the stored naive datetimes.
+    # Only when DATA_TIMEZONE is set are they converted to the viewer's
+    # timezone, which the browser then sends, and otherwise shown as stored.
+    LOCALES = env_list('LOCALES') or ['en_US']
+    DATA_TIMEZONE = os.environ.get('DATA_TIMEZONE')
+
+    # Rendered template fragments, see templating.py. They are keyed by the ids
+    # and update times of what they show, so are kept apart from the pages
+    # and view data with room for a few pages of show tiles.
+    FRAGMENT_CACHE_TYPE = CACHE_TYPE
+    FRAGMENT_CACHE_DEFAULT_TIMEOUT = 3600
+    FRAGMENT_CACHE_MAX_ENTRIES = 20000
+    FRAGMENT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    FRAGMENT_CACHE_REDIS_URL = CACHE_REDIS_URL
+
+    # Directory of the compiled templates, shared by the processes of a
+    # deployment, and whether every template is compiled at startup
+    TEMPLATE_BYTECODE_DIR = os.environ.get(
+        'TEMPLATE_BYTECODE_DIR', os.path.join(basedir, '.jinja-cache'))
+    TEMPLATE_PRECOMPILE = True
+
+    # Where `flask build-assets` writes the fingerprinted static files, and
+    # whether templates link to the sources in static/ even once they are built
+    ASSETS_BUILD_DIR = os.path.join(basedir, 'static', 'build')
+    ASSETS_DEBUG = False
+
+    # JSON API responses smaller than this many bytes are sent uncompressed
+    API_COMPRESS_MIN_SIZE = 500
+
+    # Request instrumentation, see /metrics. A statement executed this many times
+    # within one request is logged as a suspected N+1, and X-Query-Count and
+    # Server-Timing headers are added to responses in debug mode or when
+    # SQL_DEBUG_HEADERS is set.
+    N_PLUS_ONE_THRESHOLD = 5
+    METRICS_SLOW_STATEMENTS = 10
+    SQL_DEBUG_HEADERS = bool(os.environ.get('SQL_DEBUG_HEADERS'))
+
+
+class DevelopmentConfig(Config):
+    # Enable debug mode.
+    DEBUG = True
+    TEMPLATE_PRECOMPILE = False
+    ASSETS_DEBUG = True
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'TEST_DATABASE_URL', 'postgresql://<database-user>:<password>@localhost:5432/fyyur_test')
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 2)
+    WTF_CSRF_ENABLED = False
+    CACHE_TYPE = 'null'
+    FRAGMENT_CACHE_TYPE = 'null'
+    AUTOCOMPLETE_PRELOAD = False
+    SQL_DEBUG_HEADERS = True
+
+
+class ProductionConfig(Config):
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 10)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 20)
+    DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', 10)
+    DB_STATEMENT_TIMEOUT = env_int('DB_STATEMENT_TIMEOUT', 5000)
+
+    def __init__(self):
+        # Every worker must sign sessions with the same key: a client that
+        # just wrote is kept on the primary through its session, see routing.py
+        if not os.environ.get('SECRET_KEY'):
+            raise RuntimeError('SECRET_KEY must be set when FYYUR_ENV is production.')
+
+
+configs = {
+    "development": DevelopmentConfig,
+    "testing": TestingConfig,
+    "production": ProductionConfig,
+}
 
-# Connect to the database
 
-# SQLALCHEMY_DATABASE_URI = '<Put your local database url>'
-SQLALCHEMY_DATABASE_URI = 'postgresql://<database-user>:<password>@localhost:5432/fyyur'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
+def get_config():
+    return configs[os.environ.get('FYYUR_ENV', 'development')]()
@@ -0,0 +1,114 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, bindparam, case, func, select
+
+from models import db, Show, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Denormalized show counters.
+#
+# Venue and Artist keep past_shows_count and upcoming_shows_count so that
+# listings and searches read them without any aggregation. They are adjusted
+# by the handlers that create or delete shows, and the rollover command moves
+# shows from upcoming to past as their start time goes by.
+#----------------------------------------------------------------------------#
+
+
+def apply_show_deltas(model, deltas):
+    """Add ``deltas``, a dict of id -> (past, upcoming), to the counters."""
+    if not deltas:
+        return
+
+    table = model.__table__
+    db.session.execute(
+        table.update().where(table.c.id == bindparam('_id')).values(
+            past_shows_count=table.c.past_shows_count + bindparam('_past'),
+            upcoming_shows_count=table.c.upcoming_shows_count + bindparam('_upcoming')),
+        [{"_id": key, "_past": past, "_upcoming": upcoming}
+         for key, (past, upcoming) in deltas.items()])
+
+
+def count_new_shows(shows):
+    """Count ``shows``, dicts with venue_id, artist_id and start_time."""
+    now = datetime.now()
+    venue_deltas = defaultdict(lambda: [0, 0])
+    artist_deltas = defaultdict(lambda: [0, 0])
+    for show in shows:
+        upcoming = int(show["start_time"] > now)
+        venue_deltas[int(show["venue_id"])][upcoming] += 1
+        artist_deltas[int(show["artist_id"])][upcoming] += 1
+
+    apply_show_deltas(Venue, venue_deltas)
+    apply_show_deltas(Artist, artist_deltas)
+
+
+def discount_shows_of(key_column, entity_id):
+    """Uncount the shows of one venue or artist before they are deleted.
+
+    Only the counters on the other side of the shows need adjusting, since
+    the venue or artist itself is being deleted. Returns the ids of the
+    venues or artists whose counters changed.
+    """
+    other_column = Show.c.artist_id if key_column is Show.c.venue_id else Show.c.venue_id
+    other_model = Artist if key_column is Show.c.venue_id else Venue
+
+    now = datetime.now()
+    counts = db.session.query(
+        other_column,
+        func.count(case([(Show.c.start_time <= now, 1)])),
+        func.count(case([(Show.c.start_time > now, 1)])),
+    ).filter(key_column == entity_id).group_by(other_column).all()
+
+    apply_show_deltas(other_model, {
+        key: (-past, -upcoming) for key, past, upcoming in counts})
+    return [key for key, _, _ in counts]
+
+
+def refresh_counters(model, key_column, ids=None):
+    """Recompute the counters of ``model`` from Show.
+
+    ``ids`` may be a list or a subquery of the ids to refresh, all rows are
+    refreshed otherwise.
+    """
+    now = datetime.now()
+    table = model.__table__
+
+    def shows_count(*criteria):
+        return select([func.count()]).select_from(Show).where(
+            and_(key_column == table.c.id, *criteria)).as_scalar()
+
+    refresh = table.update().values(
+        past_shows_count=shows_count(Show.c.start_time <= now),
+        upcoming_shows_count=shows_count(Show.c.start_time > now))
+    if ids is not None:
+        refresh = refresh.where(table.c.id.in_(ids))
+
+    return db.session.execute(refresh).rowcount
+
+
+@click.command('rollover-show-counters')
+@click.option('--window', default=120, help='Minutes of show start times to roll over.')
+@click.option('--full', is_flag=True, help='Recompute the counters of every venue and artist.')
+@with_appcontext
+def rollover_show_counters_command(window, full):
+    """Move shows that have started from the upcoming to the past counters.
+
+    Meant to run periodically (e.g. hourly from cron) with a window longer
+    than the interval between runs. Counters are recomputed rather than
+    adjusted, so overlapping windows are harmless.
+    """
+    now = datetime.now()
+    for model, key_column in ((Venue, Show.c.venue_id), (Artist, Show.c.artist_id)):
+        ids = None
+        if not full:
+            ids = select([key_column]).where(and_(
+                Show.c.start_time > now - timedelta(minutes=window),
+                Show.c.start_time <= now))
+
+        updated = refresh_counters(model, key_column, ids)
+        click.echo(f'{model.__tablename__}: refreshed {updated} rows')
+
+    db.session.commit()
@@ -0,0 +1,141 @@
+import random
+import re
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from models import db, Show, Venue, Artist
+from partitions import existing_partitions, is_partitioned, months, partition_name
+from queries import show_listing, venue_shows, artist_shows, show_counts
+
+#----------------------------------------------------------------------------#
+# EXPLAIN checks for the hot Show queries.
+#
+# A plan fails when it reads Show, or any of its monthly partitions, with a
+# sequential scan, and when a time window listing reads partitions outside
+# its window.
+#----------------------------------------------------------------------------#
+
+# Show or one of its partitions, "Show_p2026_10" or "Show_default"
+SHOW_RELATION = re.compile(r' on "(Show(?:_\w+)?)"')
+
+
+def seed_shows(venues, artists, shows):
+    """Insert a synthetic catalog inside the current transaction."""
+    venue_ids = [db.session.execute(Venue.__table__.insert().values(
+        name=f'Explain Venue {i}', address='1 Main Street', city='Explain City',
+        state='CA', phone='000-000-0000')).inserted_primary_key[0] for i in range(venues)]
+    artist_ids = [db.session.execute(Artist.__table__.insert().values(
+        name=f'Explain Artist {i}', city='Explain City', state='CA',
+        phone='000-000-0000')).inserted_primary_key[0] for i in range(artists)]
+
+    now = datetime.now()
+    db.session.execute(Show.insert(), [{
+        "venue_id": random.choice(venue_ids),
+        "artist_id": random.choice(artist_ids),
+        "start_time": now + timedelta(hours=random.randint(-24 * 720, 24 * 360)),
+    } for _ in range(shows)])
+    db.session.execute('ANALYZE "Show"')
+
+    return venue_ids, artist_ids
+
+
+def capture_statements(calls):
+    """Statements touching Show that are executed while running ``calls``."""
+    statements = list()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if '"Show"' in statement and (statement, parameters) not in statements:
+            statements.append((statement, parameters))
+
+    engine = db.session.get_bind()
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for call in calls:
+            call()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    return statements
+
+
+def scanned_relations(plan):
+    return {match.group(1) for match in map(SHOW_RELATION.search, plan) if match}
+
+
+def window_partitions(start, end, existing):
+    """Partitions a listing from ``start`` until ``end`` may read."""
+    names = {partition_name(month) for month in months(start, end - timedelta(microseconds=1))}
+    return (names & existing) | ({'Show_default'} if names - existing else set())
+
+
+@click.command('explain-queries')
+@click.option('--venues', default=500, help='Synthetic venues to seed.')
+@click.option('--artists', default=500, help='Synthetic artists to seed.')
+@click.option('--shows', default=50000, help='Synthetic shows to seed.')
+@with_appcontext
+def explain_queries_command(venues, artists, shows):
+    """EXPLAIN the hot Show queries on a seeded dataset.
+
+    The dataset is inserted in a transaction that is rolled back at the
+    end, so the command leaves no trace in the database. It fails when one of
+    the queries reads Show or a partition of it with a sequential scan, or a
+    time window listing reads partitions outside its window.
+    """
+    if db.session.get_bind().dialect.name != 'postgresql':
+        raise click.ClickException('EXPLAIN checks need a PostgreSQL database.')
+
+    try:
+        venue_ids, artist_ids = seed_shows(venues, artists, shows)
+        venue_id, artist_id = venue_ids[0], artist_ids[0]
+
+        statements = capture_statements([
+            lambda: show_listing(),
+            lambda: venue_shows(venue_id, upcoming=True, limit=12),
+            lambda: venue_shows(venue_id, upcoming=False, limit=12),
+            lambda: artist_shows(artist_id, upcoming=True, limit=12),
+            lambda: artist_shows(artist_id, upcoming=False, limit=12),
+            lambda: show_counts(Show.c.venue_id, venue_id),
+            lambda: show_counts(Show.c.artist_id, artist_id),
+        ])
+        statements = [(statement, parameters, None) for statement, parameters in statements]
+
+        connection = db.session.connection()
+        partitioned = is_partitioned(connection)
+        if partitioned:
+            existing = existing_partitions(connection)
+            now = datetime.now()
+            for start, end in ((now, now + timedelta(days=30)),
+                               (now - timedelta(days=90), now - timedelta(days=60))):
+                statements += [
+                    (statement, parameters, window_partitions(start, end, existing))
+                    for statement, parameters in capture_statements(
+                        [lambda: show_listing(start=start, end=end)])]
+
+        cursor = connection.connection.cursor()
+        failures = 0
+        for statement, parameters, allowed in statements:
+            cursor.execute('EXPLAIN ' + statement, parameters)
+            plan = [line for line, in cursor.fetchall()]
+            problems = list()
+            if any('Seq Scan on "Show' in line for line in plan):
+                problems.append('sequential scan')
+            outside = scanned_relations(plan) - allowed if allowed is not None else None
+            if outside:
+                problems.append('reads ' + ', '.join(sorted(outside)))
+            failures += bool(problems)
+
+            click.echo(('FAIL' if problems else 'ok  ') + ' ' + ' '.join(statement.split()))
+            if problems:
+                click.echo('     ' + '; '.join(problems))
+                click.echo('\n'.join('     ' + line for line in plan))
+    finally:
+        db.session.rollback()
+
+    if failures:
+        raise click.ClickException(
+            f'{failures} of {len(statements)} queries scan Show sequentially or read unpruned partitions.')
+    click.echo(f'All {len(statements)} queries read Show through an index'
+               + (', pruned to their window.' if partitioned else '.'))
@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+
+from models import db, Show, Venue, Artist, VenueGenre, ArtistGenre
+from queries import show_listing_query, venue_shows_query, artist_shows_query
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#
+# Rows are fetched with yield_per, which turns on stream_results and makes
+# psycopg2 read through a named server-side cursor, and are serialized as they
+# arrive. Exports use constant memory and start sending bytes immediately.
+#----------------------------------------------------------------------------#
+
+FORMATS = {
+    "csv": 'text/csv',
+    "jsonl": 'application/x-ndjson',
+}
+
+BATCH_SIZE = 1000
+
+VENUE_COLUMNS = ('id', 'name', 'address', 'city', 'state', 'phone', 'website',
+                 'facebook_link', 'seeking_talent', 'seeking_description', 'image_link')
+ARTIST_COLUMNS = ('id', 'name', 'city', 'state', 'phone', 'website',
+                  'facebook_link', 'seeking_venue', 'seeking_description', 'image_link')
+
+
+def stream(query):
+    return query.yield_per(BATCH_SIZE)
+
+
+def with_genres(model, columns, genre_model, genre_key):
+    """Venues or artists in id order, each with the list of its genres.
+
+    Genres are read by a second ordered cursor and merged in, so no more
+    than one entity's genres are held at a time.
+    """
+    entities = stream(model.query.with_entities(
+        *[getattr(model, c) for c in columns]).order_by(model.id))
+    key_column = getattr(genre_model, genre_key)
+    genres = iter(stream(db.session.query(key_column, genre_model.genre).order_by(
+        key_column, genre_model.genre)))
+
+    pending = next(genres, None)
+    for entity in entities:
+        row = entity._asdict()
+        row["genres"] = list()
+        while pending is not None and pending[0] <= row["id"]:
+            if pending[0] == row["id"]:
+                row["genres"].append(pending[1])
+            pending = next(genres, None)
+        yield row
+
+
+def export_rows(kind, venue_id=None, artist_id=None):
+    """Rows of one export as dicts.
+
+    Shows use the projection of the shows page, or that of the venue or
+    artist page when ``venue_id`` or ``artist_id`` is given.
+    """
+    if kind == 'venues':
+        return with_genres(Venue, VENUE_COLUMNS, VenueGenre, 'venue_id')
+    if kind == 'artists':
+        return with_genres(Artist, ARTIST_COLUMNS, ArtistGenre, 'artist_id')
+
+    if venue_id is not None:
+        query_shows = venue_shows_query(venue_id)
+    elif artist_id is not None:
+        query_shows = artist_shows_query(artist_id)
+    else:
+        query_shows = show_listing_query()
+
+    return (s._asdict() for s in stream(query_shows.order_by(Show.c.start_time, Show.c.id)))
+
+
+def serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return ','.join(value)
+    return value
+
+
+def generate(rows, file_format):
+    """Encode ``rows`` as CSV or JSON lines, in chunks of BATCH_SIZE rows."""
+    buffer = io.StringIO()
+    writer = None
+
+    for count, row in enumerate(rows, 1):
+        if file_format == 'csv':
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow({k: serialize(v) for k, v in row.items()})
+        else:
+            buffer.write(json.dumps(row, default=serialize) + '\n')
+
+        if count % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@click.command('export-data')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('output', type=click.File('w'), default='-')
+@click.option('--format', 'file_format', type=click.Choice(list(FORMATS)), default='csv')
+@click.option('--venue', 'venue_id', type=int, help='Only export the shows of this venue.')
+@click.option('--artist', 'artist_id', type=int, help='Only export the shows of this artist.')
+@with_appcontext
+def export_data_command(kind, output, file_format, venue_id, artist_id):
+    """Export venues, artists or shows as CSV or JSONL, to stdout by default.
+
+    Venue and artist exports can be loaded back with import-data, every
+    column included.
+    """
+    for chunk in generate(export_rows(kind, venue_id, artist_id), file_format):
+        output.write(chunk)
@@ -5,14 +5,22 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # the benchmark only gates on queries per request, latencies depend on
+    # the machine it runs on
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m unittest -v && "
+            "python benchmark.py --reseed --queries-only --compare benchmark-baseline.json",
+            capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def baseline():
+    local("python benchmark.py --reseed --output benchmark-baseline.json")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -38,18 +46,11 @@ def heroku():
     local("git push heroku master")
 
 
-def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
-
-
 def deploy():
     pull()
     test()
     commit()
     heroku()
-    heroku_test()
 
 # rollback
 
@@ -0,0 +1,78 @@
+from datetime import datetime
+from functools import lru_cache
+
+import babel
+import babel.dates
+import dateutil.parser
+import pytz
+from flask import current_app, g, has_request_context, request
+
+#----------------------------------------------------------------------------#
+# Template filters.
+#
+# The datetime filter runs once per show on the shows and detail pages. Its
+# patterns are parsed by babel once, and formatted values are memoized, as
+# listings repeat the same start times. Dates are shown in the viewer's
+# locale, the best match of Accept-Language among LOCALES. Stored times are
+# naive wall clock times, shown as they are unless DATA_TIMEZONE names their
+# timezone: they are then converted to the viewer's, read from the
+# "timezone" cookie static/js/script.js sets when the page asks for it.
+#----------------------------------------------------------------------------#
+
+NAMED_FORMATS = {
+    "full": "EEEE MMMM, d, y 'at' h:mma",
+    "medium": "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=256)
+def compiled_pattern(format):
+    return babel.dates.parse_pattern(NAMED_FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=64)
+def get_locale(name):
+    return babel.Locale.parse(name)
+
+
+@lru_cache(maxsize=64)
+def get_timezone(name):
+    return pytz.timezone(name)
+
+
+@lru_cache(maxsize=8192)
+def format_in(value, format, locale, timezone, data_timezone):
+    """``value`` formatted for ``locale`` and ``timezone``, memoized."""
+    if timezone is not None:
+        if value.tzinfo is None and timezone != data_timezone:
+            value = get_timezone(data_timezone).localize(value)
+        if value.tzinfo is not None:
+            value = value.astimezone(get_timezone(timezone))
+    return compiled_pattern(format).apply(value, get_locale(locale))
+
+
+def display_settings():
+    """Names of the locale and timezone dates are shown in to this viewer.
+
+    The timezone is None when DATA_TIMEZONE is not set, as times are then
+    shown as stored.
+    """
+    config = current_app.config
+    if not has_request_context():
+        return config['LOCALES'][0], config['DATA_TIMEZONE']
+
+    settings = g.get('display_settings')
+    if settings is None:
+        locale = request.accept_languages.best_match(config['LOCALES']) or config['LOCALES'][0]
+        timezone = request.cookies.get('timezone') if config['DATA_TIMEZONE'] else None
+        if timezone not in pytz.all_timezones_set:
+            timezone = config['DATA_TIMEZONE']
+        settings = g.display_settings = (locale, timezone)
+    return settings
+
+
+def format_datetime(value, format='medium'):
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    locale, timezone = display_settings()
+    return format_in(value, format, locale, timezone, current_app.config['DATA_TIMEZONE'])
@@ -0,0 +1,235 @@
+import csv
+import math
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam
+
+from cache import cache
+from models import db, Venue
+
+#----------------------------------------------------------------------------#
+# Venue locations.
+#
+# Venues get the latitude and longitude of their city from a gazetteer, a
+# local CSV or tab separated file of places (the US Census "Places"
+# gazetteer or any file with city, state, latitude and longitude columns),
+# so no address leaves the server. `flask geocode-venues` fills them in and
+# the write handlers locate new or moved venues when GAZETTEER_PATH is set.
+#
+# Each venue also stores the geohash of its location as a GEOHASH_BITS bit
+# integer. Its leading bits are the geohash cells containing it, so the
+# venues of a cell are one range of the indexed column, and a search around
+# a point reads the few cells covering its circle before exact distances
+# are computed. Integers keep the ranges free of collation rules.
+#----------------------------------------------------------------------------#
+
+# 50 bits, 10 geohash characters, are cells of about 1.2 by 0.6 meters
+GEOHASH_BITS = 50
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_MILES = 3958.8
+
+# Most geohash cells read to cover the circle of a search
+MAX_CELLS = 12
+
+# Suffixes of the place names of the Census gazetteer
+PLACE_SUFFIXES = (' city', ' town', ' village', ' borough', ' CDP', ' municipality')
+
+GAZETTEER_COLUMNS = {
+    "city": ('city', 'name', 'NAME'),
+    "state": ('state', 'USPS'),
+    "latitude": ('latitude', 'lat', 'INTPTLAT'),
+    "longitude": ('longitude', 'lng', 'lon', 'long', 'INTPTLONG'),
+}
+
+
+def encode(latitude, longitude, bits=GEOHASH_BITS):
+    """Geohash of a point as a ``bits`` bit integer, longitude bit first."""
+    ranges = [[-180.0, 180.0], [-90.0, 90.0]]
+    point = (longitude, latitude)
+    value = 0
+    for i in range(bits):
+        bounds = ranges[i % 2]
+        middle = (bounds[0] + bounds[1]) / 2
+        if point[i % 2] >= middle:
+            value = value << 1 | 1
+            bounds[0] = middle
+        else:
+            value <<= 1
+            bounds[1] = middle
+    return value
+
+
+def decode(value, bits=GEOHASH_BITS):
+    """Latitude and longitude of the center of the cell of an integer geohash."""
+    ranges = [[-180.0, 180.0], [-90.0, 90.0]]
+    for i in range(bits):
+        bounds = ranges[i % 2]
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >> (bits - 1 - i) & 1:
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+    return (ranges[1][0] + ranges[1][1]) / 2, (ranges[0][0] + ranges[0][1]) / 2
+
+
+def to_base32(value, bits=GEOHASH_BITS):
+    """The usual geohash string of an integer geohash."""
+    return ''.join(BASE32[value >> shift & 31] for shift in range(bits - 5, -1, -5))
+
+
+def cell_size(bits):
+    """Height and width in degrees of the geohash cells of ``bits`` bits."""
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def distance(latitude1, longitude1, latitude2, longitude2):
+    """Great circle distance in miles, by the haversine formula."""
+    lat1, lat2 = math.radians(latitude1), math.radians(latitude2)
+    a = (math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2)
+         * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_ranges(latitude, longitude, radius, max_cells=MAX_CELLS):
+    """Ranges [low, high) of geohashes covering ``radius`` miles around a point.
+
+    They are the smallest cells of which at most ``max_cells`` cover the
+    bounding box of the circle, merged where they follow each other.
+    """
+    height = math.degrees(radius / EARTH_RADIUS_MILES)
+    width = height / max(math.cos(math.radians(latitude)), 0.01)
+    south, north = max(latitude - height, -90.0), min(latitude + height, 90.0)
+    west, east = longitude - width, longitude + width
+
+    for bits in range(GEOHASH_BITS, 0, -1):
+        cell_height, cell_width = cell_size(bits)
+        rows = range(math.floor((south + 90) / cell_height),
+                     min(math.floor((north + 90) / cell_height), 2 ** (bits // 2) - 1) + 1)
+        columns = range(math.floor((west + 180) / cell_width),
+                        math.floor((east + 180) / cell_width) + 1)
+        if len(rows) * min(len(columns), 2 ** ((bits + 1) // 2)) <= max_cells:
+            break
+
+    # Columns past the antimeridian wrap around to the other side
+    cells = sorted({encode(-90 + (row + 0.5) * cell_height,
+                           -180 + (column % 2 ** ((bits + 1) // 2) + 0.5) * cell_width, bits)
+                    for row in rows for column in columns})
+    shift = GEOHASH_BITS - bits
+    ranges = list()
+    for cell in cells:
+        if ranges and ranges[-1][1] == cell << shift:
+            ranges[-1][1] = cell + 1 << shift
+        else:
+            ranges.append([cell << shift, cell + 1 << shift])
+    return [tuple(r) for r in ranges]
+
+#----------------------------------------------------------------------------#
+# Gazetteer.
+#----------------------------------------------------------------------------#
+
+
+def place_key(city, state):
+    return city.strip().lower(), state.strip().upper()
+
+
+def read_gazetteer(path):
+    """{(city, state): (latitude, longitude)} of a gazetteer file."""
+    with open(path, newline='', encoding='utf8') as stream:
+        delimiter = '\t' if '\t' in stream.readline() else ','
+        stream.seek(0)
+        reader = csv.DictReader(stream, delimiter=delimiter)
+        # The Census files pad their last header with spaces
+        reader.fieldnames = [name.strip() for name in reader.fieldnames]
+
+        columns = dict()
+        for field, names in GAZETTEER_COLUMNS.items():
+            columns[field] = next((n for n in names if n in reader.fieldnames), None)
+            if columns[field] is None:
+                raise ValueError(f'{path} has no {field} column, one of {", ".join(names)} is needed.')
+
+        places = dict()
+        for row in reader:
+            city = row[columns["city"]] or ''
+            for suffix in PLACE_SUFFIXES:
+                if city.endswith(suffix):
+                    city = city[:-len(suffix)]
+                    break
+            try:
+                location = float(row[columns["latitude"]]), float(row[columns["longitude"]])
+            except (TypeError, ValueError):
+                continue
+            # The first of places sharing a name is kept
+            places.setdefault(place_key(city, row[columns["state"]] or ''), location)
+    return places
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path):
+    return read_gazetteer(path)
+
+
+def locate(venue):
+    """Set the location of ``venue`` from GAZETTEER_PATH, when it is set.
+
+    Venues of unknown cities are left without one.
+    """
+    path = current_app.config.get('GAZETTEER_PATH')
+    if not path:
+        return
+    location = load_gazetteer(path).get(place_key(venue.city, venue.state))
+    venue.latitude, venue.longitude = location or (None, None)
+    venue.geohash = encode(*location) if location else None
+
+
+@click.command('geocode-venues')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False), required=False)
+@click.option('--all', 'relocate', is_flag=True,
+              help='Locate every venue again, not only those without a location.')
+@with_appcontext
+def geocode_venues_command(path, relocate):
+    """Locate venues by their city in a gazetteer file, GAZETTEER_PATH by default."""
+    path = path or current_app.config.get('GAZETTEER_PATH')
+    if not path:
+        raise click.UsageError('Pass a gazetteer file or set GAZETTEER_PATH.')
+
+    started = time.perf_counter()
+    try:
+        places = read_gazetteer(path)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    query = db.session.query(Venue.id, Venue.city, Venue.state)
+    if not relocate:
+        query = query.filter(Venue.geohash.is_(None))
+
+    now = datetime.utcnow()
+    located, unknown = list(), Counter()
+    for venue_id, city, state in query.yield_per(10000):
+        location = places.get(place_key(city, state))
+        if location is None:
+            unknown[(city, state)] += 1
+        else:
+            located.append({"venue_id": venue_id, "latitude": location[0], "longitude": location[1],
+                            "geohash": encode(*location), "updated_at": now})
+
+    update = Venue.__table__.update().where(Venue.id == bindparam('venue_id')).values(
+        latitude=bindparam('latitude'), longitude=bindparam('longitude'),
+        geohash=bindparam('geohash'), updated_at=bindparam('updated_at'))
+    for i in range(0, len(located), 10000):
+        db.session.execute(update, located[i:i + 10000])
+    db.session.commit()
+    if located:
+        cache.invalidate('venues')
+
+    click.echo(f'Located {len(located)} venues from {len(places)} places '
+               f'in {time.perf_counter() - started:.1f}s.')
+    if unknown:
+        click.echo(f'{sum(unknown.values())} venues are in cities missing from the gazetteer:', err=True)
+        for (city, state), count in unknown.most_common(10):
+            click.echo(f'  {city}, {state}: {count}', err=True)
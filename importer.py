@@ -0,0 +1,309 @@
+import csv
+import io
+import itertools
+import json
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Boolean, text
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Show, Venue, Artist, VenueGenre, ArtistGenre
+from counters import count_new_shows
+from versions import mark_written
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+# Files are read one batch at a time, every row is validated with the same
+# form the create handlers use, and each batch is written with COPY on
+# PostgreSQL (executemany elsewhere) and committed on its own. A batch the
+# database refuses, e.g. for an id already taken, is written again row by
+# row so only the offending rows are rejected, with the database's error.
+#----------------------------------------------------------------------------#
+
+KINDS = {
+    "venues": (VenueForm, Venue, VenueGenre, 'venue_id'),
+    "artists": (ArtistForm, Artist, ArtistGenre, 'artist_id'),
+    "shows": (ShowForm, None, None, None),
+}
+
+# Exported columns the create forms do not have, read back from the row
+EXTRA_COLUMNS = {
+    "venues": ('website', 'seeking_talent', 'seeking_description'),
+    "artists": ('website', 'seeking_venue', 'seeking_description'),
+    "shows": (),
+}
+
+BOOLEANS = {'true': True, 'yes': True, '1': True, 'false': False, 'no': False, '0': False}
+
+
+def read_rows(stream, file_format):
+    """Yield (line number, row dict, errors) without loading the whole file.
+
+    Lines that are not a JSON object come with their errors, to be rejected.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+    else:
+        for line_num, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, line.rstrip('\n'), {"line": [f'Not valid JSON: {e}']}
+                continue
+            if isinstance(row, dict):
+                yield line_num, row, None
+            else:
+                yield line_num, row, {"line": ['Not a JSON object.']}
+
+
+def form_data(row):
+    data = MultiDict()
+    for key, value in row.items():
+        if key == 'genres' and isinstance(value, str):
+            value = [g.strip() for g in value.split(',') if g.strip()]
+        if isinstance(value, list):
+            data.setlist(key, [str(v) for v in value])
+        elif value is not None:
+            data.add(key, str(value))
+    return data
+
+
+def validate(form_class, row):
+    """Values of the form fields for a valid ``row``, or its errors."""
+    form = form_class(formdata=form_data(row), meta={"csrf": False})
+    if not form.validate():
+        return None, form.errors
+
+    values = {name: field.data if field.data != '' else None
+              for name, field in form._fields.items()}
+    if row.get('id') not in (None, ''):
+        values["id"] = row["id"]
+
+    for key in ('id', 'venue_id', 'artist_id'):
+        if key in values:
+            try:
+                values[key] = int(values[key])
+            except (TypeError, ValueError):
+                return None, {key: ['Not a valid integer value.']}
+
+    return values, None
+
+
+def extra_values(model, row, columns):
+    """Values of the ``columns`` of ``row`` that are not form fields, or their errors."""
+    values, errors = dict(), dict()
+    for name in columns:
+        value = row.get(name)
+        if value in (None, ''):
+            continue
+
+        column_type = model.__table__.c[name].type
+        if isinstance(column_type, Boolean):
+            if not isinstance(value, bool):
+                value = BOOLEANS.get(str(value).strip().lower())
+            if value is None:
+                errors[name] = ['Not a valid boolean value.']
+                continue
+        else:
+            value = str(value)
+            if getattr(column_type, 'length', None) and len(value) > column_type.length:
+                errors[name] = [f'Longer than {column_type.length} characters.']
+                continue
+        values[name] = value
+
+    return (None, errors) if errors else (values, None)
+
+
+def write_rows(table, rows):
+    if not rows:
+        return
+
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        connection.execute(table.insert(), rows)
+        return
+
+    columns = list(rows[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[c].isoformat() if hasattr(row[c], 'isoformat') else row[c]
+                         for c in columns])
+    buffer.seek(0)
+
+    names = ', '.join(f'"{c}"' for c in columns)
+    connection.connection.cursor().copy_expert(
+        f'COPY "{table.name}" ({names}) FROM STDIN WITH (FORMAT csv)', buffer)
+    mark_written(connection, table.name)
+
+
+def allocate_ids(model, rows):
+    """Give every row without an id one drawn from the table's sequence."""
+    missing = [row for row in rows if "id" not in row]
+    if not missing:
+        return
+
+    table = model.__tablename__
+    ids = db.session.execute(text(
+        f"select nextval(pg_get_serial_sequence('\"{table}\"', 'id')) "
+        "from generate_series(1, :n)"), {"n": len(missing)}).fetchall()
+    for row, (new_id,) in zip(missing, ids):
+        row["id"] = new_id
+
+
+def import_entities(model, genre_model, genre_key, rows):
+    entities = [{k: v for k, v in row.items() if k != 'genres'} for row in rows]
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        allocate_ids(model, entities)
+        write_rows(model.__table__, entities)
+    else:
+        # without a sequence to draw ids from, rows are inserted one by one
+        for entity in entities:
+            entity["id"] = db.session.execute(
+                model.__table__.insert().values(**entity)).inserted_primary_key[0]
+
+    write_rows(genre_model.__table__, [
+        {genre_key: entity["id"], "genre": genre}
+        for entity, row in zip(entities, rows) for genre in dict.fromkeys(row["genres"])])
+
+
+def import_shows(rows, rejects):
+    """Write the shows whose venue and artist exist, reject the others.
+
+    ``rows`` holds (line number, validated values, raw row) tuples.
+    """
+    venue_ids = {v for v, in db.session.query(Venue.id).filter(
+        Venue.id.in_({values["venue_id"] for _, values, _ in rows}))}
+    artist_ids = {a for a, in db.session.query(Artist.id).filter(
+        Artist.id.in_({values["artist_id"] for _, values, _ in rows}))}
+
+    shows = list()
+    for line_num, values, row in rows:
+        errors = dict()
+        if values["venue_id"] not in venue_ids:
+            errors["venue_id"] = ['Venue does not exist.']
+        if values["artist_id"] not in artist_ids:
+            errors["artist_id"] = ['Artist does not exist.']
+
+        if errors:
+            rejects.append((line_num, row, errors))
+        else:
+            shows.append(values)
+
+    write_rows(Show, shows)
+    count_new_shows(shows)
+    return len(shows)
+
+
+def import_batch(model, genre_model, genre_key, valid, rejects):
+    """Write the ``valid`` rows, returning how many were imported."""
+    if model is None:
+        return import_shows(valid, rejects)
+    import_entities(model, genre_model, genre_key, [v for _, v, _ in valid])
+    return len(valid)
+
+
+def integrity_errors():
+    # COPY goes through the DBAPI cursor, whose errors SQLAlchemy does not wrap
+    return IntegrityError, db.session.get_bind().dialect.dbapi.IntegrityError
+
+
+def database_error(e):
+    return {"database": [str(getattr(e, 'orig', e)).strip()]}
+
+
+def reset_sequence(model):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        table = model.__tablename__
+        db.session.execute(text(
+            f"select setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f"coalesce((select max(id) from \"{table}\"), 1))"))
+        db.session.commit()
+
+
+@click.command('import-data')
+@click.argument('kind', type=click.Choice(list(KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']),
+              help='File format, guessed from the extension by default.')
+@click.option('--batch-size', default=5000, help='Rows validated and written per transaction.')
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False),
+              help='Write rejected rows with their errors to this JSONL file.')
+@with_appcontext
+def import_data_command(kind, path, file_format, batch_size, rejects_path):
+    """Bulk import venues, artists or shows from a CSV or JSONL file.
+
+    Shows reference existing venue and artist ids, so venues and artists
+    imported with an "id" column can be followed by their shows.
+    """
+    form_class, model, genre_model, genre_key = KINDS[kind]
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+
+    started = time.perf_counter()
+    imported = rejected = 0
+    rejects_file = open(rejects_path, 'w') if rejects_path else None
+    try:
+        with open(path, newline='') as stream:
+            rows = read_rows(stream, file_format)
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+
+                valid, rejects = list(), list()
+                for line_num, row, errors in batch:
+                    if errors is None:
+                        values, errors = validate(form_class, row)
+                    if errors is None and model is not None:
+                        extra, errors = extra_values(model, row, EXTRA_COLUMNS[kind])
+                        values.update(extra or {})
+                    if errors:
+                        rejects.append((line_num, row, errors))
+                    else:
+                        valid.append((line_num, values, row))
+
+                try:
+                    batch_rejects = list()
+                    imported += import_batch(model, genre_model, genre_key, valid, batch_rejects)
+                    db.session.commit()
+                    rejects.extend(batch_rejects)
+                except integrity_errors():
+                    db.session.rollback()
+                    for line_num, values, row in valid:
+                        try:
+                            imported += import_batch(
+                                model, genre_model, genre_key, [(line_num, values, row)], rejects)
+                            db.session.commit()
+                        except integrity_errors() as e:
+                            db.session.rollback()
+                            rejects.append((line_num, row, database_error(e)))
+                except Exception:
+                    db.session.rollback()
+                    raise
+
+                rejected += len(rejects)
+                for line_num, row, errors in rejects:
+                    if rejects_file:
+                        rejects_file.write(json.dumps({"line": line_num, "row": row, "errors": errors}) + '\n')
+                    else:
+                        click.echo(f'line {line_num}: {errors}', err=True)
+
+                elapsed = time.perf_counter() - started
+                click.echo(f'{imported} imported, {rejected} rejected, '
+                           f'{imported / elapsed:.0f} rows/s')
+    finally:
+        if rejects_file:
+            rejects_file.close()
+
+    if model is not None:
+        reset_sequence(model)
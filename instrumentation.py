@@ -0,0 +1,303 @@
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+#----------------------------------------------------------------------------#
+# Request instrumentation.
+#
+# Engine events time every statement executed while a request is handled,
+# template signals time rendering, and the totals are kept per endpoint and
+# exposed at /metrics in the Prometheus text format. Statements are compared
+# by their SQL text, which holds placeholders rather than values, so the same
+# shape executed many times within one request is reported as a suspected
+# N+1.
+#----------------------------------------------------------------------------#
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CHECKOUT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+pools = weakref.WeakSet()
+
+
+def statement_shape(statement):
+    return ' '.join(statement.split())
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**values):
+    return '{' + ','.join(f'{k}="{escape_label(v)}"' for k, v in values.items()) + '}'
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = defaultdict(int)
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.n_plus_one = 0
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times checkouts, including waits for a free connection.
+
+    Used as the poolclass of the engines, see config.engine_options.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.label = None
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.wait_buckets = [0] * len(CHECKOUT_BUCKETS)
+        self.stats_lock = threading.Lock()
+        pools.add(self)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self.stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - started
+            with self.stats_lock:
+                self.checkouts += 1
+                self.wait_time += wait
+                for i, bound in enumerate(CHECKOUT_BUCKETS):
+                    if wait <= bound:
+                        self.wait_buckets[i] += 1
+
+
+class Instrumentation:
+    def __init__(self, app=None):
+        self.endpoints = defaultdict(EndpointStats)
+        self.slowest = dict()
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slow_statements = app.config.get('METRICS_SLOW_STATEMENTS', 10)
+        self.n_plus_one_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 5)
+        self.debug_headers = app.config.get('SQL_DEBUG_HEADERS', False) or app.debug
+        self.logger = app.logger
+
+        if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+            event.listen(Engine, 'handle_error', forget_failed_statement)
+            event.listen(Engine, 'engine_connect', label_pool)
+        before_render_template.connect(before_render, app)
+        template_rendered.connect(after_render, app)
+
+        app.before_request(start_request)
+        app.after_request(self.finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+
+    def finish_request(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+
+        duration = time.perf_counter() - stats["started"]
+        db_time = sum(total for _, total in stats["shapes"].values())
+        queries = sum(count for count, _ in stats["shapes"].values())
+        endpoint = request.endpoint or 'unknown'
+
+        suspects = [(count, shape) for shape, (count, _) in stats["shapes"].items()
+                    if count >= self.n_plus_one_threshold]
+        for count, shape in suspects:
+            self.logger.warning(f'Suspected N+1 in {endpoint}: {count} x {shape}')
+
+        with self.lock:
+            endpoint_stats = self.endpoints[endpoint]
+            endpoint_stats.requests[(request.method, response.status_code)] += 1
+            endpoint_stats.duration += duration
+            endpoint_stats.queries += queries
+            endpoint_stats.db_time += db_time
+            endpoint_stats.render_time += stats["render_time"]
+            endpoint_stats.n_plus_one += len(suspects)
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    endpoint_stats.buckets[i] += 1
+
+            for shape, slowest in stats["slowest"].items():
+                if slowest > self.slowest.get(shape, (0, None))[0]:
+                    self.slowest[shape] = (slowest, endpoint)
+            if len(self.slowest) > self.slow_statements:
+                kept = sorted(self.slowest.items(), key=lambda item: item[1][0], reverse=True)
+                self.slowest = dict(kept[:self.slow_statements])
+
+        if self.debug_headers:
+            response.headers['X-Query-Count'] = str(queries)
+            response.headers['Server-Timing'] = (
+                f'db;dur={db_time * 1000:.1f}, render;dur={stats["render_time"] * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}')
+            if suspects:
+                response.headers['X-N-Plus-One'] = str(len(suspects))
+
+        return response
+
+    def metrics(self):
+        lines = list()
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{name}{sample_labels} {value}' for sample_labels, value in samples)
+
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+
+            metric('fyyur_requests_total', 'counter', 'Requests handled.', [
+                (labels(endpoint=e, method=method, status=status), count)
+                for e, s in endpoints for (method, status), count in sorted(s.requests.items())])
+
+            lines.append('# HELP fyyur_request_duration_seconds Request duration.')
+            lines.append('# TYPE fyyur_request_duration_seconds histogram')
+            for e, s in endpoints:
+                total = sum(s.requests.values())
+                lines.extend(f'fyyur_request_duration_seconds_bucket{labels(endpoint=e, le=bound)} {count}'
+                             for bound, count in zip(DURATION_BUCKETS, s.buckets))
+                lines.append(f'fyyur_request_duration_seconds_bucket{labels(endpoint=e, le="+Inf")} {total}')
+                lines.append(f'fyyur_request_duration_seconds_sum{labels(endpoint=e)} {s.duration:.6f}')
+                lines.append(f'fyyur_request_duration_seconds_count{labels(endpoint=e)} {total}')
+
+            metric('fyyur_db_queries_total', 'counter', 'SQL statements executed.',
+                   [(labels(endpoint=e), s.queries) for e, s in endpoints])
+            metric('fyyur_db_seconds_total', 'counter', 'Time spent executing SQL statements.',
+                   [(labels(endpoint=e), f'{s.db_time:.6f}') for e, s in endpoints])
+            metric('fyyur_render_seconds_total', 'counter', 'Time spent rendering templates.',
+                   [(labels(endpoint=e), f'{s.render_time:.6f}') for e, s in endpoints])
+            metric('fyyur_n_plus_one_total', 'counter',
+                   'Statement shapes repeated often enough within a request to suggest an N+1.',
+                   [(labels(endpoint=e), s.n_plus_one) for e, s in endpoints])
+            metric('fyyur_slowest_statement_seconds', 'gauge', 'Slowest executions seen per statement.',
+                   [(labels(endpoint=e, statement=shape), f'{seconds:.6f}')
+                    for shape, (seconds, e) in sorted(self.slowest.items())])
+
+        self.pool_metrics(metric, lines)
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    def pool_metrics(self, metric, lines):
+        instrumented = sorted((p for p in list(pools) if p.label), key=lambda p: p.label)
+
+        metric('fyyur_db_pool_size', 'gauge', 'Connections kept open by the pool.',
+               [(labels(pool=p.label), p.size()) for p in instrumented])
+        metric('fyyur_db_pool_checked_out', 'gauge', 'Connections currently in use.',
+               [(labels(pool=p.label), p.checkedout()) for p in instrumented])
+        metric('fyyur_db_pool_overflow', 'gauge', 'Connections open beyond the pool size.',
+               [(labels(pool=p.label), max(p.overflow(), 0)) for p in instrumented])
+        metric('fyyur_db_pool_saturation', 'gauge',
+               'Connections in use as a fraction of pool size plus max overflow.',
+               [(labels(pool=p.label), f'{p.checkedout() / (p.size() + max(p._max_overflow, 0)):.4f}')
+                for p in instrumented])
+        metric('fyyur_db_pool_timeouts_total', 'counter', 'Checkouts that timed out waiting.',
+               [(labels(pool=p.label), p.timeouts) for p in instrumented])
+
+        lines.append('# HELP fyyur_db_pool_checkout_seconds Time to check a connection out of the pool.')
+        lines.append('# TYPE fyyur_db_pool_checkout_seconds histogram')
+        for p in instrumented:
+            with p.stats_lock:
+                lines.extend(f'fyyur_db_pool_checkout_seconds_bucket{labels(pool=p.label, le=bound)} {count}'
+                             for bound, count in zip(CHECKOUT_BUCKETS, p.wait_buckets))
+                lines.append(f'fyyur_db_pool_checkout_seconds_bucket{labels(pool=p.label, le="+Inf")} {p.checkouts}')
+                lines.append(f'fyyur_db_pool_checkout_seconds_sum{labels(pool=p.label)} {p.wait_time:.6f}')
+                lines.append(f'fyyur_db_pool_checkout_seconds_count{labels(pool=p.label)} {p.checkouts}')
+
+#----------------------------------------------------------------------------#
+# Hooks.
+#----------------------------------------------------------------------------#
+
+
+def start_request():
+    g.sql_stats = {
+        "started": time.perf_counter(),
+        "shapes": dict(),
+        "slowest": dict(),
+        "render_time": 0.0,
+        "render_started": list(),
+    }
+
+
+def measured(call):
+    """Result of ``call`` and the stats of the statements it ran.
+
+    For work done for a request on another thread, see merge_stats.
+    """
+    start_request()
+    return call(), g.pop('sql_stats')
+
+
+def merge_stats(stats):
+    """Add statement stats collected by ``measured`` to the current request."""
+    if 'sql_stats' not in g:
+        return
+
+    for shape, (count, total) in stats["shapes"].items():
+        current_count, current_total = g.sql_stats["shapes"].get(shape, (0, 0.0))
+        g.sql_stats["shapes"][shape] = (current_count + count, current_total + total)
+    for shape, slowest in stats["slowest"].items():
+        g.sql_stats["slowest"][shape] = max(g.sql_stats["slowest"].get(shape, 0.0), slowest)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', list()).append(time.perf_counter())
+    if context is not None:
+        context.query_timed = True
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if context is not None:
+        context.query_timed = False
+    stats = g.get('sql_stats') if has_request_context() else None
+    if stats is None:
+        return
+
+    shape = statement_shape(statement)
+    count, total = stats["shapes"].get(shape, (0, 0.0))
+    stats["shapes"][shape] = (count + 1, total + elapsed)
+    stats["slowest"][shape] = max(stats["slowest"].get(shape, 0.0), elapsed)
+
+
+def forget_failed_statement(context):
+    """Drop the start time of a statement that raised, which after_cursor_execute never sees."""
+    execution = context.execution_context
+    if execution is not None and getattr(execution, 'query_timed', False):
+        execution.query_timed = False
+        context.connection.info['query_started'].pop()
+
+
+def label_pool(conn, branch):
+    pool = conn.engine.pool
+    if isinstance(pool, InstrumentedQueuePool) and pool.label is None:
+        url = conn.engine.url
+        pool.label = f'{url.host or "localhost"}/{url.database}'
+
+
+def before_render(sender, template, context, **extra):
+    if 'sql_stats' in g:
+        g.sql_stats["render_started"].append(time.perf_counter())
+
+
+def after_render(sender, template, context, **extra):
+    if 'sql_stats' in g and g.sql_stats["render_started"]:
+        g.sql_stats["render_time"] += time.perf_counter() - g.sql_stats["render_started"].pop()
+
+
+instrumentation = Instrumentation()
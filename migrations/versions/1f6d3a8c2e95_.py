@@ -0,0 +1,38 @@
+"""denormalized show counters on Venue and Artist
+
+Revision ID: 1f6d3a8c2e95
+Revises: e7a2b94f1c08
+Create Date: 2026-10-18 14:02:19.350846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f6d3a8c2e95'
+down_revision = 'e7a2b94f1c08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+        # backfill, afterwards the counters are kept up to date by the app
+        # and the rollover-show-counters command
+        op.execute(f'''
+        update "{table}"
+           set past_shows_count = (select count(*) from "Show"
+                                    where {key} = "{table}".id and start_time <= current_timestamp),
+               upcoming_shows_count = (select count(*) from "Show"
+                                        where {key} = "{table}".id and start_time > current_timestamp)
+        ''')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'upcoming_shows_count')
+        op.drop_column(table, 'past_shows_count')
@@ -0,0 +1,48 @@
+"""Artist and venue recommendations
+
+Revision ID: 3b7f0c9e5d21
+Revises: 6e2d8b4f1a93
+Create Date: 2026-10-18 18:05:49.731652
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7f0c9e5d21'
+down_revision = '6e2d8b4f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ArtistRecommendation',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('recommended_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['recommended_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'rank')
+    )
+    op.create_index('ix_ArtistRecommendation_recommended_id', 'ArtistRecommendation', ['recommended_id'], unique=False)
+    op.create_table('VenueRecommendation',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'rank')
+    )
+    op.create_index('ix_VenueRecommendation_artist_id', 'VenueRecommendation', ['artist_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_VenueRecommendation_artist_id', table_name='VenueRecommendation')
+    op.drop_table('VenueRecommendation')
+    op.drop_index('ix_ArtistRecommendation_recommended_id', table_name='ArtistRecommendation')
+    op.drop_table('ArtistRecommendation')
@@ -0,0 +1,30 @@
+"""Locations and geohashes of venues
+
+Revision ID: 6e2d8b4f1a93
+Revises: 9c5e1b7d3f42
+Create Date: 2026-10-18 17:12:36.520184
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2d8b4f1a93'
+down_revision = '9c5e1b7d3f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('geohash', sa.BigInteger(), nullable=True))
+    op.create_index('ix_Venue_geohash', 'Venue', ['geohash'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_geohash', table_name='Venue')
+    op.drop_column('Venue', 'geohash')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
@@ -0,0 +1,29 @@
+"""Table write counters
+
+Revision ID: 7a3e5c1d9b64
+Revises: 3b7f0c9e5d21
+Create Date: 2026-10-18 19:12:03.418227
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3e5c1d9b64'
+down_revision = '3b7f0c9e5d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table = op.create_table('TableVersion',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table, [{"name": 'Venue'}, {"name": 'Artist'}, {"name": 'Show'}])
+
+
+def downgrade():
+    op.drop_table('TableVersion')
@@ -0,0 +1,30 @@
+"""covering indexes for the paginated listings
+
+Revision ID: 8d41c7a0e6b2
+Revises: 5b8e2f4c9a17
+Create Date: 2026-10-18 10:03:47.118254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41c7a0e6b2'
+down_revision = '5b8e2f4c9a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keyset pages on /venues, /artists and /shows are answered from these
+    # indexes alone, without visiting the table rows
+    op.create_index('ix_Venue_id_listing', 'Venue', ['id', 'name', 'city', 'state'], unique=False)
+    op.create_index('ix_Artist_id_listing', 'Artist', ['id', 'name'], unique=False)
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Artist_id_listing', table_name='Artist')
+    op.drop_index('ix_Venue_id_listing', table_name='Venue')
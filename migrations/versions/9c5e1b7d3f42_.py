@@ -0,0 +1,94 @@
+"""Partition Show by month of start_time (PostgreSQL)
+
+Revision ID: 9c5e1b7d3f42
+Revises: a4c8e1f07b3d
+Create Date: 2026-10-18 16:02:11.407913
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c5e1b7d3f42'
+down_revision = 'a4c8e1f07b3d'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_Show_start_time_id': 'start_time, id',
+    'ix_Show_venue_id_start_time': 'venue_id, start_time',
+    'ix_Show_artist_id_start_time': 'artist_id, start_time',
+}
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month):
+    return month_start(month + timedelta(days=32))
+
+
+def create_show_table(name, primary_key, partitioned):
+    op.execute(
+        f'CREATE TABLE "{name}" ('
+        'id integer NOT NULL DEFAULT nextval(\'"Show_id_seq"\'::regclass), '
+        'venue_id integer NOT NULL REFERENCES "Venue" (id), '
+        'artist_id integer NOT NULL REFERENCES "Artist" (id), '
+        'start_time timestamp without time zone NOT NULL, '
+        f'CONSTRAINT "{name}_pkey" PRIMARY KEY ({primary_key})'
+        ')' + (' PARTITION BY RANGE (start_time)' if partitioned else ''))
+
+
+def move_shows(source, target):
+    op.execute(
+        f'INSERT INTO "{target}" (id, venue_id, artist_id, start_time) '
+        f'SELECT id, venue_id, artist_id, start_time FROM "{source}"')
+    op.execute(f'ALTER SEQUENCE "Show_id_seq" OWNED BY "{target}".id')
+    op.execute(f'DROP TABLE "{source}"')
+
+
+def upgrade():
+    # Partitioning is PostgreSQL only, other databases keep a plain table
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for name in INDEXES:
+        op.drop_index(name, table_name='Show')
+    op.rename_table('Show', 'Show_unpartitioned')
+    op.execute('ALTER TABLE "Show_unpartitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_unpartitioned_pkey"')
+
+    # The primary key of a partitioned table must include the partition key
+    create_show_table('Show', 'id, start_time', partitioned=True)
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+
+    # One partition per month from the first show to a year from now
+    now = datetime.now()
+    first, last = op.get_bind().execute(
+        sa.text('select min(start_time), max(start_time) from "Show_unpartitioned"')).first()
+    month = month_start(min(first or now, now))
+    last = max(last or now, month_start(now) + timedelta(days=366))
+    while month <= last:
+        op.execute(
+            f'CREATE TABLE "Show_p{month:%Y_%m}" PARTITION OF "Show" '
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')")
+        month = next_month(month)
+
+    move_shows('Show_unpartitioned', 'Show')
+    for name, columns in INDEXES.items():
+        op.execute(f'CREATE INDEX "{name}" ON "Show" ({columns})')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    create_show_table('Show_unpartitioned', 'id', partitioned=False)
+    move_shows('Show', 'Show_unpartitioned')
+    op.rename_table('Show_unpartitioned', 'Show')
+    op.execute('ALTER TABLE "Show" RENAME CONSTRAINT "Show_unpartitioned_pkey" TO "Show_pkey"')
+    for name, columns in INDEXES.items():
+        op.execute(f'CREATE INDEX "{name}" ON "Show" ({columns})')
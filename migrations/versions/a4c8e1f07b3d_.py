@@ -0,0 +1,28 @@
+"""updated_at row versions on Venue and Artist
+
+Revision ID: a4c8e1f07b3d
+Revises: 1f6d3a8c2e95
+Create Date: 2026-10-18 15:20:43.118274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c8e1f07b3d'
+down_revision = '1f6d3a8c2e95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
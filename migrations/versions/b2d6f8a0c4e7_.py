@@ -0,0 +1,45 @@
+"""widen the covering indexes of the venue and show listings
+
+Revision ID: b2d6f8a0c4e7
+Revises: 7a3e5c1d9b64
+Create Date: 2026-10-18 20:41:09.562318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d6f8a0c4e7'
+down_revision = '7a3e5c1d9b64'
+branch_labels = None
+depends_on = None
+
+# The venue listing also reads updated_at and the upcoming shows counter,
+# and the show listing the venue and artist ids, so the indexes of
+# 8d41c7a0e6b2 no longer answered them alone. PostgreSQL carries the extra
+# columns as INCLUDE columns, other databases as trailing keys.
+INDEXES = {
+    'ix_Venue_id_listing': ('Venue', ['id', 'name', 'city', 'state'], ['updated_at', 'upcoming_shows_count']),
+    'ix_Show_start_time_id': ('Show', ['start_time', 'id'], ['venue_id', 'artist_id']),
+}
+
+
+def create_index(name, table, keys, include):
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(f'CREATE INDEX "{name}" ON "{table}" ({", ".join(keys)}) '
+                   f'INCLUDE ({", ".join(include)})')
+    else:
+        op.create_index(name, table, keys + include, unique=False)
+
+
+def upgrade():
+    for name, (table, keys, include) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+        create_index(name, table, keys, include)
+
+
+def downgrade():
+    for name, (table, keys, include) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+        op.create_index(name, table, keys, unique=False)
@@ -0,0 +1,40 @@
+"""indexes and not null constraints on Show
+
+Revision ID: c3f09d5e7a61
+Revises: 8d41c7a0e6b2
+Create Date: 2026-10-18 11:20:05.664310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f09d5e7a61'
+down_revision = '8d41c7a0e6b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # shows missing a venue, an artist or a start time are never listed
+    # since every page inner joins them, drop them before adding NOT NULL
+    op.execute('''
+    delete from "Show"
+     where venue_id is null or artist_id is null or start_time is null
+    ''')
+    op.alter_column('Show', 'venue_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('Show', 'artist_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('Show', 'start_time', existing_type=sa.DateTime(), nullable=False)
+
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+
+    op.alter_column('Show', 'start_time', existing_type=sa.DateTime(), nullable=True)
+    op.alter_column('Show', 'artist_id', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('Show', 'venue_id', existing_type=sa.Integer(), nullable=True)
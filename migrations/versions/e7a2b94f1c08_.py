@@ -0,0 +1,65 @@
+"""normalized genre tables
+
+Revision ID: e7a2b94f1c08
+Revises: c3f09d5e7a61
+Create Date: 2026-10-18 12:41:52.907731
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2b94f1c08'
+down_revision = 'c3f09d5e7a61'
+branch_labels = None
+depends_on = None
+
+# values of enums.Genre when this revision was written
+genres = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+          'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+          'Rock n Roll', 'Soul', 'Other']
+
+
+def upgrade():
+    op.create_table('VenueGenre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre', sa.Enum(*genres, name='genre', native_enum=False), nullable=False),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre')
+    )
+    op.create_index('ix_VenueGenre_genre_venue_id', 'VenueGenre', ['genre', 'venue_id'], unique=False)
+    op.create_table('ArtistGenre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre', sa.Enum(*genres, name='genre', native_enum=False), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'genre')
+    )
+    op.create_index('ix_ArtistGenre_genre_artist_id', 'ArtistGenre', ['genre', 'artist_id'], unique=False)
+
+    # move the comma-joined genres into the new tables, values that are not
+    # part of the Genre enum (e.g. 'Swing' in the seed data) become 'Other'
+    known = ', '.join("'" + g.replace("'", "''") + "'" for g in genres)
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(f'''
+        insert into "{table}Genre" ({key}, genre)
+        select distinct id, case when trim(g) in ({known}) then trim(g) else 'Other' end
+          from "{table}", unnest(string_to_array(_genres, ',')) as g
+         where trim(g) <> ''
+        ''')
+        op.drop_column(table, '_genres')
+
+
+def downgrade():
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('_genres', sa.String(length=120), nullable=True))
+        op.execute(f'''
+        update "{table}"
+           set _genres = coalesce((select left(string_agg(genre, ',' order by genre), 120)
+                                     from "{table}Genre" where {key} = "{table}".id), '')
+        ''')
+
+    op.drop_index('ix_ArtistGenre_genre_artist_id', table_name='ArtistGenre')
+    op.drop_table('ArtistGenre')
+    op.drop_index('ix_VenueGenre_genre_venue_id', table_name='VenueGenre')
+    op.drop_table('VenueGenre')
@@ -0,0 +1,181 @@
+from datetime import datetime
+
+from sqlalchemy import DDL, event
+from sqlalchemy.ext.associationproxy import association_proxy
+
+from enums import Genre
+from routing import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+# On PostgreSQL the table is partitioned by month of start_time, with a
+# primary key of (id, start_time), see partitions.py
+Show = db.Table('Show',
+                db.Column('id', db.Integer, primary_key=True),
+                db.Column('venue_id', db.Integer, db.ForeignKey(
+                    'Venue.id'), nullable=False),
+                db.Column('artist_id', db.Integer, db.ForeignKey(
+                    'Artist.id'), nullable=False),
+                db.Column('start_time', db.DateTime, nullable=False),
+                db.Index('ix_Show_start_time_id', 'start_time', 'id',
+                         'venue_id', 'artist_id'),
+                db.Index('ix_Show_venue_id_start_time',
+                         'venue_id', 'start_time'),
+                db.Index('ix_Show_artist_id_start_time',
+                         'artist_id', 'start_time')
+                )
+
+# genres are stored one row per (entity, genre), restricted to the values of
+# the Genre enum by a CHECK constraint
+genre_type = db.Enum(*[g.value for g in Genre],
+                     name='genre', native_enum=False)
+
+
+class VenueGenre(db.Model):
+    __tablename__ = 'VenueGenre'
+    __table_args__ = (
+        db.Index('ix_VenueGenre_genre_venue_id', 'genre', 'venue_id'),
+    )
+
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'Venue.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(genre_type, primary_key=True)
+
+
+class ArtistGenre(db.Model):
+    __tablename__ = 'ArtistGenre'
+    __table_args__ = (
+        db.Index('ix_ArtistGenre_genre_artist_id', 'genre', 'artist_id'),
+    )
+
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'Artist.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(genre_type, primary_key=True)
+
+
+class Venue(db.Model):
+    __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_id_listing', 'id', 'name', 'city', 'state',
+                 'updated_at', 'upcoming_shows_count'),
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+        db.Index('ix_Venue_geohash', 'geohash'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    address = db.Column(db.String(120), nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120), nullable=False)
+    website = db.Column(db.String(120))
+    facebook_link = db.Column(db.String(120))
+    seeking_talent = db.Column(db.Boolean)
+    seeking_description = db.Column(db.String, nullable=True)
+    image_link = db.Column(db.String(500))
+    # Location of the venue's city and its integer geohash, see geo.py
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.BigInteger)
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
+    artists = db.relationship('Artist', secondary=Show,
+                              backref=db.backref('venues', lazy=True))
+
+    genre_rows = db.relationship('VenueGenre', lazy='selectin', cascade='all, delete-orphan',
+                                 order_by='VenueGenre.genre')
+    genres = association_proxy(
+        'genre_rows', 'genre', creator=lambda genre: VenueGenre(genre=genre))
+
+    def __repr__(self):
+        return f'<Venue Id: {self.id} , Name: {self.name} Genres: {self.genres}>'
+
+
+class Artist(db.Model):
+    __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_id_listing', 'id', 'name'),
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120), nullable=False)
+    website = db.Column(db.String(120))
+    facebook_link = db.Column(db.String(120))
+    seeking_venue = db.Column(db.Boolean)
+    seeking_description = db.Column(db.String, nullable=True)
+    image_link = db.Column(db.String(500))
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
+
+    genre_rows = db.relationship('ArtistGenre', lazy='selectin', cascade='all, delete-orphan',
+                                 order_by='ArtistGenre.genre')
+    genres = association_proxy(
+        'genre_rows', 'genre', creator=lambda genre: ArtistGenre(genre=genre))
+
+    def __repr__(self):
+        return f'<Artist Id: {self.id} , Name: {self.name} Genres: {self.genres}>'
+
+
+# Recommendations computed by `flask compute-recommendations`, see
+# recommend.py: the closest artists of each artist and the artists that fit
+# each venue, ranked from 1
+class ArtistRecommendation(db.Model):
+    __tablename__ = 'ArtistRecommendation'
+    __table_args__ = (
+        db.Index('ix_ArtistRecommendation_recommended_id', 'recommended_id'),
+    )
+
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'Artist.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    recommended_id = db.Column(db.Integer, db.ForeignKey(
+        'Artist.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+
+class VenueRecommendation(db.Model):
+    __tablename__ = 'VenueRecommendation'
+    __table_args__ = (
+        db.Index('ix_VenueRecommendation_artist_id', 'artist_id'),
+    )
+
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'Venue.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'Artist.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+
+# Write counters of the listed tables, see versions.py
+class TableVersion(db.Model):
+    __tablename__ = 'TableVersion'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+
+
+event.listen(TableVersion.__table__, 'after_create', DDL(
+    """INSERT INTO "TableVersion" (name) VALUES ('Venue'), ('Artist'), ('Show')"""))
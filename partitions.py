@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Monthly partitions of Show.
+#
+# On PostgreSQL, Show is partitioned by range of start_time since migration
+# 9c5e1b7d3f42: one partition per month, "Show_p2026_10" holding October
+# 2026, and "Show_default" for start times no partition covers. Queries on
+# upcoming shows or a time window only read the partitions they span, so
+# years of past shows do not slow them down. The partitions of the coming
+# months are created ahead of time by `flask create-show-partitions`, run
+# monthly, which also moves rows that fell in the default partition.
+#----------------------------------------------------------------------------#
+
+SHOW_INDEXES = {
+    "ix_Show_start_time_id": '(start_time, id) INCLUDE (venue_id, artist_id)',
+    "ix_Show_venue_id_start_time": '(venue_id, start_time)',
+    "ix_Show_artist_id_start_time": '(artist_id, start_time)',
+}
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month):
+    return month_start(month + timedelta(days=32))
+
+
+def months(first, last):
+    """Start of every month from that of ``first`` to that of ``last``."""
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def partition_name(month):
+    return f'Show_p{month:%Y_%m}'
+
+
+def is_partitioned(connection):
+    return connection.execute(text(
+        "select exists (select 1 from pg_partitioned_table "
+        "where partrelid = to_regclass('\"Show\"'))")).scalar()
+
+
+def existing_partitions(connection):
+    return {name for name, in connection.execute(text(
+        "select child.relname from pg_inherits "
+        "join pg_class child on child.oid = pg_inherits.inhrelid "
+        "where pg_inherits.inhparent = '\"Show\"'::regclass"))}
+
+
+def create_partition(connection, month):
+    """Create the partition of ``month``, moving its rows out of the default one."""
+    name = partition_name(month)
+    bounds = {"start": month, "end": next_month(month)}
+    stranded = connection.execute(text(
+        'select exists (select 1 from "Show_default" '
+        'where start_time >= :start and start_time < :end)'), bounds).scalar()
+
+    # PostgreSQL refuses to create a partition whose rows are in the
+    # default partition, so it is detached while they are moved
+    if stranded:
+        connection.execute(text('ALTER TABLE "Show" DETACH PARTITION "Show_default"'))
+    connection.execute(text(
+        f'CREATE TABLE "{name}" PARTITION OF "Show" '
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"))
+    if stranded:
+        connection.execute(text(
+            'INSERT INTO "Show" SELECT * FROM "Show_default" '
+            'WHERE start_time >= :start AND start_time < :end'), bounds)
+        connection.execute(text(
+            'DELETE FROM "Show_default" WHERE start_time >= :start AND start_time < :end'), bounds)
+        connection.execute(text('ALTER TABLE "Show" ATTACH PARTITION "Show_default" DEFAULT'))
+    return name
+
+
+def create_partitions(connection, first, last):
+    """Create the missing partitions of the months from ``first`` to ``last``."""
+    existing = existing_partitions(connection)
+    return [create_partition(connection, month) for month in months(first, last)
+            if partition_name(month) not in existing]
+
+
+def partition_show_table(connection, months_ahead=12):
+    """Turn a plain Show table into a partitioned one, as the migration does.
+
+    Used by the benchmark, whose schema comes from create_all.
+    """
+    for name in SHOW_INDEXES:
+        connection.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+    connection.execute(text('ALTER TABLE "Show" RENAME TO "Show_unpartitioned"'))
+    connection.execute(text(
+        'ALTER TABLE "Show_unpartitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_unpartitioned_pkey"'))
+    connection.execute(text(
+        'CREATE TABLE "Show" ('
+        'id integer NOT NULL DEFAULT nextval(\'"Show_id_seq"\'::regclass), '
+        'venue_id integer NOT NULL REFERENCES "Venue" (id), '
+        'artist_id integer NOT NULL REFERENCES "Artist" (id), '
+        'start_time timestamp without time zone NOT NULL, '
+        'CONSTRAINT "Show_pkey" PRIMARY KEY (id, start_time)'
+        ') PARTITION BY RANGE (start_time)'))
+    connection.execute(text('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT'))
+
+    now = datetime.now()
+    first, last = connection.execute(text(
+        'select min(start_time), max(start_time) from "Show_unpartitioned"')).first()
+    create_partitions(connection, min(first or now, now),
+                      max(last or now, month_start(now) + timedelta(days=31 * months_ahead)))
+
+    connection.execute(text(
+        'INSERT INTO "Show" (id, venue_id, artist_id, start_time) '
+        'SELECT id, venue_id, artist_id, start_time FROM "Show_unpartitioned"'))
+    connection.execute(text('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id'))
+    connection.execute(text('DROP TABLE "Show_unpartitioned"'))
+    for name, columns in SHOW_INDEXES.items():
+        connection.execute(text(f'CREATE INDEX "{name}" ON "Show" {columns}'))
+    connection.execute(text('ANALYZE "Show"'))
+
+
+@click.command('create-show-partitions')
+@click.option('--months-ahead', default=12, show_default=True,
+              help='Months after the current one to create partitions for.')
+@with_appcontext
+def create_show_partitions_command(months_ahead):
+    """Create the monthly partitions of Show for the coming months.
+
+    Months of shows that went to the default partition get theirs too.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql' or not is_partitioned(connection):
+        raise click.ClickException('Show is not partitioned, see migration 9c5e1b7d3f42.')
+
+    now = datetime.now()
+    first, last = connection.execute(text(
+        'select min(start_time), max(start_time) from "Show_default"')).first()
+    first = min(first or now, now)
+    last = max(last or now, month_start(now) + timedelta(days=31 * months_ahead))
+
+    created = create_partitions(connection, first, last)
+    db.session.commit()
+    click.echo(f'Created {len(created)} partitions' + (f': {", ".join(created)}.' if created else '.'))
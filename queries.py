@@ -0,0 +1,312 @@
+import base64
+import json
+from datetime import datetime
+from functools import lru_cache
+
+from sqlalchemy import case, func, text, tuple_
+
+import geo
+from models import db, Show, Venue, Artist, ArtistRecommendation, VenueRecommendation
+from search import apply_filters
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v
+                      for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, keys):
+    """Key values stored in ``cursor``, or None when it can not be read."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(keys):
+            return None
+        return [datetime.fromisoformat(v) if isinstance(k.type, db.DateTime) else v
+                for k, v in zip(keys, values)]
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_page(query, keys, after=None, before=None, per_page=50):
+    """One page of ``query`` ordered by the ``keys`` columns.
+
+    ``after`` and ``before`` are cursors taken from the "next" and "prev"
+    values of a previous page. Each key must be selected by the query under
+    its column name so the cursors can be read back from the rows.
+    """
+    after = decode_cursor(after, keys) if after else None
+    before = decode_cursor(before, keys) if before else None
+
+    if before is not None:
+        query = query.filter(tuple_(*keys) < tuple_(*before)).order_by(
+            *[k.desc() for k in keys])
+    else:
+        if after is not None:
+            query = query.filter(tuple_(*keys) > tuple_(*after))
+        query = query.order_by(*keys)
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is not None:
+        rows.reverse()
+
+    def cursor(row):
+        return encode_cursor([getattr(row, k.name) for k in keys])
+
+    page = {"items": rows, "prev": None, "next": None}
+    if rows:
+        if after is not None or (before is not None and has_more):
+            page["prev"] = cursor(rows[0])
+        if before is not None or has_more:
+            page["next"] = cursor(rows[-1])
+
+    return page
+
+#----------------------------------------------------------------------------#
+# Listings.
+#----------------------------------------------------------------------------#
+
+
+def venue_directory(genre=None, **page_args):
+    """A page of venues grouped by (city, state), with upcoming shows counts.
+
+    The counts are read from the denormalized counters, and the areas are
+    built in one pass over the rows with a dict keyed by (city, state).
+    ``genre`` limits the page to the venues of that genre.
+    """
+    query_venues = Venue.query.with_entities(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.updated_at,
+        Venue.upcoming_shows_count.label('num_upcoming_shows'))
+    if genre:
+        query_venues = query_venues.filter(Venue.genre_rows.any(genre=genre))
+
+    page = keyset_page(query_venues, [Venue.id], **page_args)
+
+    areas = dict()
+    for v in page["items"]:
+        area = areas.get((v.city, v.state))
+        if area is None:
+            area = areas[(v.city, v.state)] = {
+                "city": v.city,
+                "state": v.state,
+                "venues": list(),
+            }
+        area["venues"].append(v._asdict())
+
+    page["items"] = list(areas.values())
+    return page
+
+
+def artist_listing(genre=None, **page_args):
+    query_artists = Artist.query.with_entities(Artist.id, Artist.name)
+    if genre:
+        query_artists = query_artists.filter(
+            Artist.genre_rows.any(genre=genre))
+
+    page = keyset_page(query_artists, [Artist.id], **page_args)
+    page["items"] = [a._asdict() for a in page["items"]]
+    return page
+
+
+def show_listing_query():
+    """Shows joined with their venue and artist, as listed on the shows page.
+
+    The update times of the venue and artist key the cached show tiles.
+    """
+    return db.session.query(Show).join(Venue).join(Artist).with_entities(
+        Show.c.id.label('id'), Show.c.venue_id.label('venue_id'), Venue.name.label('venue_name'),
+        Show.c.artist_id.label('artist_id'), Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'), Show.c.start_time.label('start_time'),
+        Venue.updated_at.label('venue_updated_at'), Artist.updated_at.label('artist_updated_at'))
+
+
+def show_listing(start=None, end=None, city=None, state=None, genre=None,
+                 venue_id=None, artist_id=None, **page_args):
+    """A page of shows by start time, optionally from ``start`` until ``end``.
+
+    Shows may be limited to the venues of a city or state, the artists of a
+    genre, or one venue or artist. On PostgreSQL a time window only reads
+    the monthly partitions of Show it spans.
+    """
+    query_shows = show_listing_query()
+    if start:
+        query_shows = query_shows.filter(Show.c.start_time >= start)
+    if end:
+        query_shows = query_shows.filter(Show.c.start_time < end)
+    if venue_id:
+        query_shows = query_shows.filter(Show.c.venue_id == venue_id)
+    if artist_id:
+        query_shows = query_shows.filter(Show.c.artist_id == artist_id)
+    query_shows = apply_filters(query_shows, Venue, city, state)
+    if genre:
+        query_shows = query_shows.filter(Artist.genre_rows.any(genre=genre))
+
+    page = keyset_page(query_shows, [Show.c.start_time, Show.c.id], **page_args)
+    page["items"] = [s._asdict() for s in page["items"]]
+    return page
+
+
+@lru_cache(maxsize=64)
+def nearby_points_statement(ranges):
+    """Geohashes in one of ``ranges`` ranges with their number of venues, up to :cap.
+
+    Written as text and kept per number of ranges: building and compiling
+    the expression took more time than running it. Each range is walked
+    from one distinct geohash to the next through the index, and venues are
+    counted up to :cap per geohash, so the venues sharing the location of
+    their city are not all read.
+    """
+    walks = ', '.join(
+        f'range_{i}(geohash) AS ('
+        f'SELECT (SELECT min(geohash) FROM "Venue" WHERE geohash BETWEEN :low_{i} AND :high_{i}) '
+        f'UNION ALL SELECT (SELECT min(geohash) FROM "Venue" WHERE geohash > range_{i}.geohash '
+        f'AND geohash <= :high_{i}) FROM range_{i} WHERE range_{i}.geohash IS NOT NULL)'
+        for i in range(ranges))
+    points = ' UNION ALL '.join(f'SELECT geohash FROM range_{i}' for i in range(ranges))
+    return text(
+        f'WITH RECURSIVE {walks} '
+        'SELECT point.geohash, (SELECT count(*) FROM (SELECT 1 FROM "Venue" '
+        'WHERE "Venue".geohash = point.geohash LIMIT :cap) AS capped) AS venues '
+        f'FROM ({points}) AS point WHERE point.geohash IS NOT NULL')
+
+
+@lru_cache(maxsize=256)
+def nearby_venues_statement(points, partial):
+    """Venues of ``points`` geohashes, and the first :remaining by id of :last when ``partial``."""
+    columns = 'SELECT id, name, city, state, latitude, longitude FROM "Venue"'
+    parts = list()
+    if points:
+        marks = ', '.join(f':point_{i}' for i in range(points))
+        parts.append(f'{columns} WHERE geohash IN ({marks}) AND id != :exclude_id')
+    if partial:
+        parts.append(f'SELECT * FROM ({columns} WHERE geohash = :last AND id != :exclude_id '
+                     'ORDER BY id LIMIT :remaining) AS last_point')
+    return text(' UNION ALL '.join(parts))
+
+
+def nearby_venues(latitude, longitude, radius, limit, exclude_id=None):
+    """The ``limit`` venues closest to a point within ``radius`` miles, closest first.
+
+    Candidate locations are read by geohash ranges around the point with
+    their number of venues, up to ``limit``, and sorted by their exact distance. The search
+    starts at a fraction of ``radius`` and widens until ``limit`` venues are
+    found, so a dense city does not read every venue within the full radius.
+    Venues located by a gazetteer share the location of their city, so only
+    as many venues as needed are then read, those of the closest locations
+    and the first by id of the farthest one.
+    """
+    wanted = limit + 1 if exclude_id else limit
+    search_radius = radius / 64
+    while True:
+        search_radius = min(search_radius, radius)
+        ranges = geo.covering_ranges(latitude, longitude, search_radius)
+        params = {"cap": wanted}
+        for i, (low, high) in enumerate(ranges):
+            params[f'low_{i}'], params[f'high_{i}'] = low, high - 1
+
+        points = list()
+        for geohash, venues in db.session.execute(nearby_points_statement(len(ranges)), params):
+            distance = geo.distance(latitude, longitude, *geo.decode(geohash))
+            if distance <= search_radius:
+                points.append((distance, geohash, venues))
+
+        if sum(venues for _, _, venues in points) >= wanted or search_radius >= radius:
+            break
+        search_radius *= 4
+
+    points.sort()
+    whole, last, remaining = list(), None, wanted
+    for _, geohash, venues in points:
+        if venues >= remaining:
+            last = geohash
+            break
+        whole.append(geohash)
+        remaining -= venues
+    if not whole and last is None:
+        return list()
+
+    params = {f'point_{i}': geohash for i, geohash in enumerate(whole)}
+    params.update(exclude_id=exclude_id or 0, last=last, remaining=remaining)
+    rows = db.session.execute(nearby_venues_statement(len(whole), last is not None), params)
+    found = [dict(v, distance=round(geo.distance(latitude, longitude, v.latitude, v.longitude), 2))
+             for v in rows]
+    found.sort(key=lambda v: (v["distance"], v["id"]))
+    return found[:limit]
+
+#----------------------------------------------------------------------------#
+# Detail pages.
+#----------------------------------------------------------------------------#
+
+
+def split_shows(query, upcoming, limit):
+    """The first ``limit`` upcoming or past shows of ``query``.
+
+    Upcoming shows come soonest first and past shows most recent first.
+    """
+    now = datetime.now()
+    if upcoming:
+        query = query.filter(Show.c.start_time > now).order_by(
+            Show.c.start_time, Show.c.id)
+    else:
+        query = query.filter(Show.c.start_time <= now).order_by(
+            Show.c.start_time.desc(), Show.c.id.desc())
+
+    return [s._asdict() for s in query.limit(limit)]
+
+
+def venue_shows_query(venue_id):
+    return db.session.query(Show).join(Artist).filter(Show.c.venue_id == venue_id).with_entities(
+        Show.c.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'), Show.c.start_time)
+
+
+def artist_shows_query(artist_id):
+    return db.session.query(Show).join(Venue).filter(Show.c.artist_id == artist_id).with_entities(
+        Show.c.venue_id, Venue.name.label('venue_name'), Venue.image_link.label('venue_image_link'), Show.c.start_time)
+
+
+def similar_artists(artist_id):
+    """Stored recommendations of ``artist_id``, see recommend.py."""
+    return [r._asdict() for r in db.session.query(ArtistRecommendation).join(
+        Artist, Artist.id == ArtistRecommendation.recommended_id).filter(
+        ArtistRecommendation.artist_id == artist_id).order_by(ArtistRecommendation.rank).with_entities(
+        Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'))]
+
+
+def fitting_artists(venue_id):
+    return [r._asdict() for r in db.session.query(VenueRecommendation).join(
+        Artist, Artist.id == VenueRecommendation.artist_id).filter(
+        VenueRecommendation.venue_id == venue_id).order_by(VenueRecommendation.rank).with_entities(
+        Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'))]
+
+
+def venue_shows(venue_id, upcoming, limit):
+    return split_shows(venue_shows_query(venue_id), upcoming, limit)
+
+
+def artist_shows(artist_id, upcoming, limit):
+    return split_shows(artist_shows_query(artist_id), upcoming, limit)
+
+#----------------------------------------------------------------------------#
+# Counts.
+#----------------------------------------------------------------------------#
+
+
+def show_counts(key_column, entity_id):
+    """Past and upcoming shows counts of one venue or artist in one query."""
+    now = datetime.now()
+    counts = db.session.query(
+        func.count(case([(Show.c.start_time <= now, 1)])
+                   ).label('past_shows_count'),
+        func.count(case([(Show.c.start_time > now, 1)])
+                   ).label('upcoming_shows_count'),
+    ).filter(key_column == entity_id).one()
+
+    return counts._asdict()
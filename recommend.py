@@ -0,0 +1,198 @@
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func
+
+from cache import cache
+from enums import Genre
+from importer import write_rows
+from models import db, Show, Venue, Artist, VenueGenre, ArtistGenre, ArtistRecommendation, VenueRecommendation
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+#----------------------------------------------------------------------------#
+# Recommendations.
+#
+# `flask compute-recommendations` scores pairs from two kinds of vectors:
+#
+# * genre vectors, one-hot over the Genre enum, compared by cosine;
+# * co-booking vectors from Show, one row per venue and one column per
+#   artist, weighted log(1 + shows).
+#
+# Two artists are similar when they share genres and play at the same
+# venues, scored as RECOMMENDATION_GENRE_WEIGHT times the cosine of their
+# genre vectors plus the rest times the cosine of their venue columns. An
+# artist fits a venue when its genres match the venue's and it plays at the
+# venues that share artists with this one, the venue to venue cosines
+# times the bookings, scaled to 0-1 per venue. Artists already booked at a
+# venue are not recommended to it.
+#
+# Scores are computed RECOMMENDATION_BLOCK_SIZE rows at a time with sparse
+# products, and the top RECOMMENDATION_COUNT of each row are stored in
+# ArtistRecommendation and VenueRecommendation, so the detail pages only
+# read them.
+#----------------------------------------------------------------------------#
+
+GENRES = {g.value: i for i, g in enumerate(Genre)}
+
+
+def positions(ids):
+    return {entity_id: i for i, entity_id in enumerate(ids)}
+
+
+def genre_matrix(rows, index):
+    """Unit length one-hot genre rows of the entities of ``index``."""
+    rows = [(index[entity_id], GENRES[genre]) for entity_id, genre in rows
+            if entity_id in index and genre in GENRES]
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), ([r for r, _ in rows], [c for _, c in rows])),
+        shape=(len(index), len(GENRES)))
+    return normalize_rows(matrix)
+
+
+def booking_matrix(pairs, venue_index, artist_index):
+    """Venues by artists, weighted log(1 + shows)."""
+    pairs = [(venue_index[v], artist_index[a], count) for v, a, count in pairs
+             if v in venue_index and a in artist_index]
+    return sparse.csr_matrix(
+        (np.log1p(np.array([c for _, _, c in pairs], dtype=np.float32)),
+         ([v for v, _, _ in pairs], [a for _, a, _ in pairs])),
+        shape=(len(venue_index), len(artist_index)))
+
+
+def normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def top_k(scores, k, offset=0):
+    """Rows, columns, ranks and scores of the ``k`` best positive scores of each row."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return (np.empty(0, dtype=int),) * 3 + (np.empty(0),)
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+    # Positive scores are sorted first, so they are ranked from 1
+    rows = np.broadcast_to(np.arange(offset, offset + scores.shape[0])[:, None], best.shape)
+    ranks = np.broadcast_to(np.arange(1, k + 1), best.shape)
+    keep = best_scores > 0
+    return rows[keep], best[keep], ranks[keep], best_scores[keep]
+
+
+def similar_artists(artist_genres, bookings, k, genre_weight, block_size):
+    """Blocks of the top ``k`` other artists of each artist by genre and co-booking cosine."""
+    genres = artist_genres.toarray()
+    venues = normalize_rows(bookings.T.tocsr())
+    for start in range(0, genres.shape[0], block_size):
+        end = min(start + block_size, genres.shape[0])
+        scores = genre_weight * genres[start:end].dot(genres.T)
+        scores += (1 - genre_weight) * venues[start:end].dot(venues.T).toarray()
+        scores[np.arange(end - start), np.arange(start, end)] = -np.inf
+        yield top_k(scores, k, start)
+
+
+def venue_fits(venue_genres, artist_genres, bookings, k, genre_weight, block_size):
+    """Blocks of the top ``k`` artists of each venue by genre match and bookings of similar venues."""
+    artist_genres = artist_genres.toarray()
+    venue_genres = venue_genres.toarray()
+    booked = normalize_rows(bookings)
+    # Bookings of the venues sharing each artist, artists by artists, so a
+    # block of venues is never multiplied by every other venue
+    shared = booked.T.dot(bookings).tocsr()
+    for start in range(0, venue_genres.shape[0], block_size):
+        end = min(start + block_size, venue_genres.shape[0])
+        scores = genre_weight * venue_genres[start:end].dot(artist_genres.T)
+
+        own = bookings[start:end].tocoo()
+        played = booked[start:end].dot(shared).toarray()
+        played[own.row, own.col] = 0
+        peak = played.max(axis=1, keepdims=True)
+        peak[peak == 0] = 1
+        scores += (1 - genre_weight) * played / peak
+
+        scores[own.row, own.col] = -np.inf
+        yield top_k(scores, k, start)
+
+
+def ranked_rows(blocks, row_ids, column_ids, row_key, column_key, computed_at):
+    """Yield the rows to store of each block of top scores."""
+    row_ids, column_ids = np.asarray(row_ids), np.asarray(column_ids)
+    for row, column, rank, score in blocks:
+        yield [{row_key: r, "rank": n, column_key: c, "score": v, "computed_at": computed_at}
+               for r, c, n, v in zip(row_ids[row].tolist(), column_ids[column].tolist(),
+                                     rank.tolist(), score.tolist())]
+
+
+def compute_recommendations(k, genre_weight, block_size):
+    """Replace the stored recommendations, returning how many were stored."""
+    venue_ids = [i for i, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [i for i, in db.session.query(Artist.id).order_by(Artist.id)]
+    venue_index, artist_index = positions(venue_ids), positions(artist_ids)
+
+    venue_genres = genre_matrix(db.session.query(VenueGenre.venue_id, VenueGenre.genre), venue_index)
+    artist_genres = genre_matrix(db.session.query(ArtistGenre.artist_id, ArtistGenre.genre), artist_index)
+    bookings = booking_matrix(
+        db.session.query(Show.c.venue_id, Show.c.artist_id, func.count())
+        .group_by(Show.c.venue_id, Show.c.artist_id), venue_index, artist_index)
+
+    now = datetime.utcnow()
+    kinds = (
+        (ArtistRecommendation, ranked_rows(
+            similar_artists(artist_genres, bookings, k, genre_weight, block_size),
+            artist_ids, artist_ids, 'artist_id', 'recommended_id', now)),
+        (VenueRecommendation, ranked_rows(
+            venue_fits(venue_genres, artist_genres, bookings, k, genre_weight, block_size),
+            venue_ids, artist_ids, 'venue_id', 'artist_id', now)),
+    )
+
+    # Swapped in one transaction, pages read the previous ones until commit.
+    # Each block is written as it is scored, so only one is held at a time.
+    stored = list()
+    try:
+        for model, blocks in kinds:
+            db.session.query(model).delete(synchronize_session=False)
+            count = 0
+            for rows in blocks:
+                write_rows(model.__table__, rows)
+                count += len(rows)
+            stored.append(count)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    cache.invalidate('recommendations')
+    return tuple(stored)
+
+
+@click.command('compute-recommendations')
+@click.option('--count', type=int, help='Recommendations stored per artist and venue, '
+                                        'RECOMMENDATION_COUNT by default.')
+@with_appcontext
+def compute_recommendations_command(count):
+    """Compute and store similar artists and the artists fitting each venue.
+
+    Needs numpy and scipy. Run it nightly, e.g. from cron.
+    """
+    if np is None:
+        raise click.ClickException('numpy and scipy are needed: pip install numpy scipy')
+
+    config = current_app.config
+    started = time.perf_counter()
+    artists, venues = compute_recommendations(
+        count or config['RECOMMENDATION_COUNT'], config['RECOMMENDATION_GENRE_WEIGHT'],
+        config['RECOMMENDATION_BLOCK_SIZE'])
+    click.echo(f'Stored {artists} artist and {venues} venue recommendations '
+               f'in {time.perf_counter() - started:.1f}s.')
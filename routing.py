@@ -0,0 +1,174 @@
+import itertools
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, has_request_context, request, session as client_session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, exc, orm, select
+from sqlalchemy.sql.expression import Select, CompoundSelect, UpdateBase
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#
+# Each URI in READ_REPLICA_URIS becomes a "replica_<n>" bind. SELECTs issued
+# while handling a GET request, or a view marked with reads_from_replica, are
+# sent to a healthy replica picked round-robin for the session. Everything
+# else goes to the primary: writes, reads outside of requests (CLI commands),
+# reads of a session that has written, and reads of a client that wrote in
+# the last REPLICA_STICKY_SECONDS, so it sees its own writes after the
+# redirect while the replicas catch up.
+#----------------------------------------------------------------------------#
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def reads_from_replica(view):
+    """Let a view that is not a GET, such as a search form, read from replicas."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return view(*args, **kwargs)
+    wrapper.reads_from_replica = True
+    return wrapper
+
+
+class ReplicaSet:
+    """The replica binds of one app, with their health."""
+
+    def __init__(self, db, app, keys):
+        self.db = db
+        self.app = app
+        self.keys = keys
+        self.rotation = itertools.cycle(keys)
+        self.down_until = {key: 0.0 for key in keys}
+        self.checked_at = {key: 0.0 for key in keys}
+        self.watched = set()
+        self.lock = threading.Lock()
+        self.probe_locks = {key: threading.Lock() for key in keys}
+
+    def engine(self, key):
+        engine = self.db.get_engine(self.app, bind=key)
+        if key not in self.watched:
+            self.watched.add(key)
+            event.listen(engine, 'handle_error', lambda context: self.failed(key, context))
+        return engine
+
+    def failed(self, key, context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, exc.OperationalError):
+            self.mark_down(key)
+
+    def mark_down(self, key):
+        retry = self.app.config['REPLICA_RETRY_INTERVAL']
+        self.down_until[key] = time.monotonic() + retry
+        self.app.logger.warning(f'Read replica {key} is down, skipping it for {retry}s.')
+
+    def healthy(self, key):
+        """Whether ``key`` can serve reads, probing it every REPLICA_CHECK_INTERVAL.
+
+        Requests wait for a probe in progress rather than use the replica
+        before it is known to be up.
+        """
+        if self.down_until[key] > time.monotonic():
+            return False
+        if time.monotonic() - self.checked_at[key] < self.app.config['REPLICA_CHECK_INTERVAL']:
+            return True
+
+        with self.probe_locks[key]:
+            if self.down_until[key] > time.monotonic():
+                return False
+            if time.monotonic() - self.checked_at[key] < self.app.config['REPLICA_CHECK_INTERVAL']:
+                return True
+
+            try:
+                with self.engine(key).connect() as connection:
+                    connection.execute(select([1]))
+            except exc.DBAPIError:
+                return False
+            self.checked_at[key] = time.monotonic()
+            return True
+
+    def pick(self):
+        """The next healthy replica engine, or None when all are down."""
+        for _ in self.keys:
+            with self.lock:
+                key = next(self.rotation)
+            if self.healthy(key):
+                return self.engine(key)
+        return None
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self.replicas = self.app.extensions.get('replicas')
+        self.replica = None
+        self.wrote = False
+        event.listen(self, 'before_flush', self.mark_written)
+        event.listen(self, 'after_commit', self.stick_to_primary)
+        event.listen(self, 'after_rollback', self.reset)
+
+    def mark_written(self, *args):
+        self.wrote = True
+
+    def stick_to_primary(self, *args):
+        if self.wrote and has_request_context():
+            client_session['_primary_until'] = time.time() + self.app.config['REPLICA_STICKY_SECONDS']
+        self.reset()
+
+    def reset(self, *args):
+        self.wrote = False
+
+    def reads_from_replica(self, clause):
+        if not self.replicas or self.wrote or not has_request_context():
+            return False
+        if not isinstance(clause, (Select, CompoundSelect)) or clause._for_update_arg is not None:
+            return False
+        if client_session.get('_primary_until', 0) > time.time():
+            return False
+
+        view = current_app.view_functions.get(request.endpoint)
+        return request.method in READ_METHODS or getattr(view, 'reads_from_replica', False)
+
+    def get_bind(self, mapper=None, clause=None):
+        if isinstance(clause, UpdateBase):
+            self.wrote = True
+        elif self.reads_from_replica(clause):
+            if self.replica is None:
+                self.replica = self.replicas.pick()
+            if self.replica is not None:
+                return self.replica
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy whose sessions send reads to the READ_REPLICA_URIS."""
+
+    def init_app(self, app):
+        uris = app.config.get('READ_REPLICA_URIS') or []
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.update({f'replica_{i}': uri for i, uri in enumerate(uris)})
+        app.config['SQLALCHEMY_BINDS'] = binds
+        app.config.setdefault('REPLICA_CHECK_INTERVAL', 10)
+        app.config.setdefault('REPLICA_RETRY_INTERVAL', 30)
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+
+        super().init_app(app)
+        if uris:
+            app.extensions['replicas'] = ReplicaSet(
+                self, app, [f'replica_{i}' for i in range(len(uris))])
+
+    def writable_binds(self, bind, app):
+        """``bind`` with '__all__' limited to the primary and non-replica binds."""
+        if bind != '__all__':
+            return bind
+        binds = self.get_app(app).config.get('SQLALCHEMY_BINDS') or {}
+        return [None] + [key for key in binds if not key.startswith('replica_')]
+
+    def create_all(self, bind='__all__', app=None):
+        super().create_all(self.writable_binds(bind, app), app)
+
+    def drop_all(self, bind='__all__', app=None):
+        super().drop_all(self.writable_binds(bind, app), app)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
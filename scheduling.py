@@ -0,0 +1,181 @@
+import time
+from bisect import bisect_right, insort
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+import dateutil.parser
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import or_
+
+from cache import cache
+from counters import count_new_shows
+from forms import ShowForm
+from importer import read_rows, validate, write_rows
+from models import db, Show, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Show scheduling.
+#
+# A show books its venue and its artist for SHOW_DURATION minutes from its
+# start time. Shows are checked in the order given against the bookings
+# already stored and those accepted before them. All shows last the same
+# time, so a venue or artist is free at ``start`` unless it holds a booking
+# starting within one duration either side of it. The start times are kept
+# sorted per venue and per artist and searched with bisect.
+#
+# The venues and artists of a batch are locked (SELECT ... FOR UPDATE) while
+# it is checked and written, so concurrent batches can not book the same
+# slot.
+#----------------------------------------------------------------------------#
+
+
+class Bookings:
+    """Sorted start times of the shows of each venue or artist."""
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.starts = defaultdict(list)
+
+    def add(self, key, start):
+        insort(self.starts[key], start)
+
+    def clash(self, key, start):
+        """Start time of a booking of ``key`` overlapping one at ``start``, or None."""
+        starts = self.starts[key]
+        i = bisect_right(starts, start - self.duration)
+        if i < len(starts) and starts[i] < start + self.duration:
+            return starts[i]
+        return None
+
+
+def parse_row(row):
+    """``row`` with its start time in the format of the show form."""
+    start_time = row.get('start_time')
+    if isinstance(start_time, datetime):
+        start_time = start_time.strftime('%Y-%m-%d %H:%M:%S')
+    elif isinstance(start_time, str) and start_time.strip():
+        try:
+            start_time = dateutil.parser.parse(start_time).strftime('%Y-%m-%d %H:%M:%S')
+        except (ValueError, OverflowError):
+            pass
+    return dict(row, start_time=start_time)
+
+
+def locked_ids(model, ids):
+    """The ids of ``ids`` that exist, locking their rows until commit."""
+    if not ids:
+        return set()
+    return {i for i, in db.session.query(model.id).filter(
+        model.id.in_(ids)).order_by(model.id).with_for_update()}
+
+
+def load_bookings(shows, duration):
+    """Bookings of the venues and artists of ``shows`` around their start times."""
+    venues = Bookings(duration)
+    artists = Bookings(duration)
+    if not shows:
+        return venues, artists
+
+    earliest = min(s["start_time"] for s in shows) - duration
+    latest = max(s["start_time"] for s in shows) + duration
+    stored = db.session.query(Show.c.venue_id, Show.c.artist_id, Show.c.start_time).filter(
+        Show.c.start_time > earliest, Show.c.start_time < latest,
+        or_(Show.c.venue_id.in_({s["venue_id"] for s in shows}),
+            Show.c.artist_id.in_({s["artist_id"] for s in shows})))
+
+    for venue_id, artist_id, start_time in stored:
+        venues.add(venue_id, start_time)
+        artists.add(artist_id, start_time)
+    return venues, artists
+
+
+def schedule_shows(rows, atomic=False):
+    """Validate ``rows`` and insert the shows that fit, in one transaction.
+
+    ``rows`` are dicts with venue_id, artist_id and start_time. Returns the
+    inserted shows and a list of (index, row, errors) for the rejected
+    rows. With ``atomic``, nothing is inserted when any row is rejected.
+    """
+    duration = timedelta(minutes=current_app.config['SHOW_DURATION'])
+    valid, rejects = list(), list()
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            rejects.append((index, row, {"row": ['Not an object.']}))
+            continue
+        values, errors = validate(ShowForm, parse_row(row))
+        if errors:
+            rejects.append((index, row, errors))
+        else:
+            valid.append((index, row, values))
+
+    try:
+        venue_ids = locked_ids(Venue, {v["venue_id"] for _, _, v in valid})
+        artist_ids = locked_ids(Artist, {v["artist_id"] for _, _, v in valid})
+        venues, artists = load_bookings([v for _, _, v in valid], duration)
+
+        shows = list()
+        for index, row, values in valid:
+            errors = dict()
+            venue_id, artist_id, start = values["venue_id"], values["artist_id"], values["start_time"]
+            venue_clash = venues.clash(venue_id, start)
+            artist_clash = artists.clash(artist_id, start)
+            if venue_id not in venue_ids:
+                errors["venue_id"] = ['Venue does not exist.']
+            elif venue_clash:
+                errors["venue_id"] = [f'Venue is booked for a show at {venue_clash}.']
+            if artist_id not in artist_ids:
+                errors["artist_id"] = ['Artist does not exist.']
+            elif artist_clash:
+                errors["artist_id"] = [f'Artist is booked for a show at {artist_clash}.']
+
+            if errors:
+                rejects.append((index, row, errors))
+            else:
+                venues.add(venue_id, start)
+                artists.add(artist_id, start)
+                shows.append({"venue_id": venue_id, "artist_id": artist_id, "start_time": start})
+
+        rejects.sort(key=lambda reject: reject[0])
+        if atomic and rejects:
+            shows = list()
+
+        write_rows(Show, shows)
+        count_new_shows(shows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if shows:
+        cache.invalidate('venues', 'shows',
+                         *{f'venue:{s["venue_id"]}' for s in shows},
+                         *{f'artist:{s["artist_id"]}' for s in shows})
+    return shows, rejects
+
+
+@click.command('schedule-shows')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']),
+              help='File format, guessed from the extension by default.')
+@click.option('--atomic', is_flag=True, help='Schedule nothing when any show is rejected.')
+@with_appcontext
+def schedule_shows_command(path, file_format, atomic):
+    """Schedule the shows of a CSV or JSONL file, e.g. a tour, at once.
+
+    Shows whose venue or artist is already booked at that time, by a stored
+    show or an earlier one in the file, are rejected.
+    """
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+    with open(path, newline='') as stream:
+        numbered = list(read_rows(stream, file_format))
+    lines = [line_num for line_num, _, _ in numbered]
+
+    # Unreadable lines are rejected as rows that are not objects
+    started = time.perf_counter()
+    shows, rejects = schedule_shows([row for _, row, _ in numbered], atomic)
+    for index, row, errors in rejects:
+        click.echo(f'line {lines[index]}: {numbered[index][2] or errors}', err=True)
+    click.echo(f'{len(shows)} scheduled, {len(rejects)} rejected '
+               f'in {time.perf_counter() - started:.2f}s.')
@@ -0,0 +1,147 @@
+import threading
+
+from flask import current_app
+from sqlalchemy import event, func
+
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Name search.
+#
+# On PostgreSQL the name filter is served by the pg_trgm GIN indexes created
+# in migration 5b8e2f4c9a17, and results are ranked by trigram similarity.
+# Other databases (SQLite test runs) use an in-process trigram index instead.
+# Terms shorter than a trigram would scan every name, so they match nothing,
+# and matches are only counted up to SEARCH_COUNT_LIMIT.
+#----------------------------------------------------------------------------#
+
+# Ids bound in one IN clause, below SQLite's limit on bound variables
+IN_CHUNK_SIZE = 500
+
+
+def trigrams(value):
+    padded = f'  {value.lower()} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class TrigramIndex:
+    """In-process inverted index from name trigrams to row ids.
+
+    It is built lazily from the model's table and rebuilt on the next search
+    once the latest updated_at or the number of rows of the model changed,
+    which also catches the Core inserts of imports and the benchmark.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.names = dict()
+        self.grams = dict()
+        self.postings = dict()
+        self.stale = True
+        self.version = None
+        self.lock = threading.Lock()
+
+    def invalidate(self, *args):
+        self.stale = True
+
+    def current_version(self):
+        return db.session.query(func.max(self.model.updated_at), func.count(self.model.id)).one()
+
+    def build(self, version):
+        names = dict()
+        grams = dict()
+        postings = dict()
+        for row_id, name in db.session.query(self.model.id, self.model.name):
+            names[row_id] = name.lower()
+            grams[row_id] = trigrams(name)
+            for gram in grams[row_id]:
+                postings.setdefault(gram, set()).add(row_id)
+
+        self.names, self.grams, self.postings = names, grams, postings
+        self.version = version
+        self.stale = False
+
+    def search(self, term):
+        """Ids of the names containing ``term``, best trigram match first."""
+        version = self.current_version()
+        with self.lock:
+            if self.stale or version != self.version:
+                self.build(version)
+
+        term = term.lower()
+        inner = [term[i:i + 3] for i in range(len(term) - 2)]
+        if inner:
+            candidates = set.intersection(
+                *[self.postings.get(gram, set()) for gram in inner])
+        else:
+            candidates = self.names.keys()
+
+        term_grams = trigrams(term)
+        matches = [row_id for row_id in candidates
+                   if term in self.names[row_id]]
+        return sorted(matches, key=lambda row_id: (
+            -similarity(term_grams, self.grams[row_id]), self.names[row_id]))
+
+
+fallback_indexes = {Venue: TrigramIndex(Venue), Artist: TrigramIndex(Artist)}
+
+for model, index in fallback_indexes.items():
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, index.invalidate)
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def apply_filters(query, model, city=None, state=None, genre=None):
+    if city:
+        query = query.filter(func.lower(model.city) == city.lower())
+    if state:
+        query = query.filter(model.state == state)
+    if genre:
+        query = query.filter(model.genre_rows.any(genre=genre))
+    return query
+
+
+def search_names(model, term, limit, **filters):
+    """Rows (id, name, num_upcoming_shows) of ``model`` matching ``term``.
+
+    Returns a tuple of the number of matches, up to SEARCH_COUNT_LIMIT, and
+    the ``limit`` best ranked rows. ``filters`` may narrow the results by
+    city, state and genre.
+    """
+    if len(term) < current_app.config['SEARCH_MIN_LENGTH']:
+        return 0, []
+    count_limit = current_app.config['SEARCH_COUNT_LIMIT']
+
+    query = apply_filters(db.session.query(
+        model.id, model.name, model.upcoming_shows_count.label('num_upcoming_shows')
+    ), model, **filters)
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        query = query.filter(
+            model.name.ilike(f'%{escape_like(term)}%', escape='\\'))
+        count = db.session.query(func.count()).select_from(
+            query.limit(count_limit).subquery()).scalar()
+        results = query.order_by(
+            func.similarity(model.name, term).desc(), model.name
+        ).limit(limit).all()
+        return count, results
+
+    ranked_ids = fallback_indexes[model].search(term)
+    if any(filters.values()):
+        matched_ids = set()
+        for i in range(0, len(ranked_ids), IN_CHUNK_SIZE):
+            chunk = ranked_ids[i:i + IN_CHUNK_SIZE]
+            matched_ids.update(r.id for r in query.filter(model.id.in_(chunk)))
+        ranked_ids = [row_id for row_id in ranked_ids if row_id in matched_ids]
+
+    rows = {r.id: r for r in query.filter(model.id.in_(ranked_ids[:limit]))}
+    return min(len(ranked_ids), count_limit), [rows[row_id] for row_id in ranked_ids[:limit]]
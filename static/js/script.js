@@ -2,3 +2,50 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Lets the server show dates in the viewer's timezone when it converts them
+// (DATA_TIMEZONE is set), see filters.py.
+document.addEventListener('DOMContentLoaded', function () {
+  if (!document.body.hasAttribute('data-viewer-timezone')) {
+    return;
+  }
+  var timezone = window.Intl && Intl.DateTimeFormat().resolvedOptions().timeZone;
+  if (timezone && document.cookie.indexOf('timezone=' + timezone) === -1) {
+    document.cookie = 'timezone=' + timezone + '; path=/; max-age=31536000; samesite=lax';
+  }
+});
+
+// Suggests names as a search box is typed in, see autocomplete.py.
+document.addEventListener('DOMContentLoaded', function () {
+  var inputs = document.querySelectorAll('input[data-autocomplete]');
+  Array.prototype.forEach.call(inputs, function (input) {
+    var kind = input.getAttribute('data-autocomplete');
+    var list = document.getElementById(input.getAttribute('list'));
+    var timer = null;
+    var last = '';
+
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        var prefix = input.value.trim();
+        if (!prefix || prefix === last) {
+          return;
+        }
+        last = prefix;
+        fetch('/api/v1/autocomplete?kind=' + kind + '&q=' + encodeURIComponent(prefix))
+          .then(function (response) { return response.json(); })
+          .then(function (data) {
+            if (prefix !== last) {
+              return;
+            }
+            list.innerHTML = '';
+            data[kind].forEach(function (match) {
+              var option = document.createElement('option');
+              option.value = match.name;
+              list.appendChild(option);
+            });
+          });
+      }, 100);
+    });
+  });
+});
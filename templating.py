@@ -0,0 +1,92 @@
+import hashlib
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from cache import fragment_cache
+
+#----------------------------------------------------------------------------#
+# Template compilation and fragment caching.
+#
+# Compiled templates are kept in TEMPLATE_BYTECODE_DIR, and with
+# TEMPLATE_PRECOMPILE every template is loaded at startup, so requests never
+# parse or compile one. Expensive blocks are wrapped in a cache tag keyed by
+# a name and the values they are rendered from, such as entity ids and
+# update times:
+#
+#   {% cache 'show-tile', show.id, show.venue_updated_at, show.artist_updated_at %}
+#     ...
+#   {% endcache %}
+#
+# An edit gives the fragment a new key, so fragments are never invalidated,
+# the stale ones age out of the fragment cache.
+#----------------------------------------------------------------------------#
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render', [nodes.List(key)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        name, *values = key
+        digest = hashlib.sha1(repr(values).encode()).hexdigest()
+        return fragment_cache.get_or_set(f'fragment:{name}:{digest}', caller)
+
+
+def precompile(env):
+    """Load every HTML template of ``env``, compiling the ones not cached yet."""
+    names = env.list_templates(extensions=['html'])
+    for name in names:
+        env.get_template(name)
+    return names
+
+
+def setup_templates(app):
+    """Add the cache tag and the bytecode cache to the app's templates.
+
+    Call it once the filters are registered, templates using an unknown
+    filter do not compile.
+    """
+    env = app.jinja_env
+    env.add_extension(FragmentCacheExtension)
+    fragment_cache.init_app(app)
+
+    directory = app.config.get('TEMPLATE_BYTECODE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+    if app.config.get('TEMPLATE_PRECOMPILE'):
+        precompile(env)
+
+    app.cli.add_command(compile_templates_command)
+
+
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates_command():
+    """Compile every template into TEMPLATE_BYTECODE_DIR, e.g. on deploy."""
+    env = current_app.jinja_env
+    if env.cache is not None:
+        env.cache.clear()
+    if env.bytecode_cache is not None:
+        env.bytecode_cache.clear()
+
+    started = time.perf_counter()
+    names = precompile(env)
+    click.echo(f'Compiled {len(names)} templates in {time.perf_counter() - started:.2f}s '
+               f'into {current_app.config["TEMPLATE_BYTECODE_DIR"]}.')
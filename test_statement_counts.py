@@ -0,0 +1,86 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault('FYYUR_ENV', 'testing')
+
+from app import app  # noqa: E402
+from models import db, Show, Venue, Artist  # noqa: E402
+
+#----------------------------------------------------------------------------#
+# Statements per request.
+#
+# The listings, the searches and the venue and artist pages must issue the
+# same number of statements however many rows they show. Counts are read from the
+# X-Query-Count header the request instrumentation adds in testing, against
+# the database of TEST_DATABASE_URL, which is emptied.
+#----------------------------------------------------------------------------#
+
+
+class StatementCountTest(unittest.TestCase):
+    def setUp(self):
+        app.config['DETAIL_QUERY_WORKERS'] = 1
+        self.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add(self, venues, artists, shows_per_venue):
+        """Ids of ``venues`` venues and ``artists`` artists, each venue with its shows."""
+        with app.app_context():
+            venue_rows = [Venue(name=f'Hop Venue {i}', city='San Francisco', state='CA', address=f'{i} Main St',
+                                phone='123-123-1234', genres=['Jazz']) for i in range(venues)]
+            artist_rows = [Artist(name=f'Hop Artist {i}', city='San Francisco', state='CA',
+                                  phone='123-123-1234', genres=['Jazz']) for i in range(artists)]
+            db.session.add_all(venue_rows + artist_rows)
+            db.session.commit()
+
+            now = datetime.now()
+            db.session.execute(Show.insert(), [
+                {"venue_id": v.id, "artist_id": artist_rows[i % artists].id,
+                 "start_time": now + timedelta(days=i - shows_per_venue // 2)}
+                for v in venue_rows for i in range(shows_per_venue)])
+            db.session.commit()
+            return [v.id for v in venue_rows], [a.id for a in artist_rows]
+
+    def statements(self, response):
+        self.assertEqual(response.status_code, 200)
+        return int(response.headers['X-Query-Count'])
+
+    def test_listings_are_bounded(self):
+        routes = ['/venues', '/artists', '/shows', '/api/v1/venues']
+        self.add(1, 1, 1)
+        counts = [self.statements(self.client.get(route)) for route in routes]
+
+        self.add(40, 40, 3)
+        for route, count in zip(routes, counts):
+            self.assertEqual(self.statements(self.client.get(route)), count, route)
+
+    def test_searches_are_bounded(self):
+        self.add(2, 2, 1)
+        venues = self.statements(self.client.post('/venues/search', data={"search_term": 'hop'}))
+        artists = self.statements(self.client.post('/artists/search', data={"search_term": 'hop'}))
+
+        self.add(40, 40, 3)
+        self.assertEqual(self.statements(self.client.post('/venues/search', data={"search_term": 'hop'})), venues)
+        self.assertEqual(self.statements(self.client.post('/artists/search', data={"search_term": 'hop'})), artists)
+
+    def test_detail_pages_are_bounded(self):
+        (small_venue,), (small_artist,) = self.add(1, 1, 1)
+        (large_venue,), (large_artist,) = self.add(1, 1, 40)
+
+        venue = self.statements(self.client.get(f'/venues/{small_venue}'))
+        artist = self.statements(self.client.get(f'/artists/{small_artist}'))
+        self.assertLessEqual(venue, 6)
+        self.assertLessEqual(artist, 6)
+        self.assertEqual(self.statements(self.client.get(f'/venues/{large_venue}')), venue)
+        self.assertEqual(self.statements(self.client.get(f'/artists/{large_artist}')), artist)
+
+
+if __name__ == '__main__':
+    unittest.main()
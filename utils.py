@@ -1,19 +1,22 @@
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+from datetime import datetime, timedelta
 
-def VenueViewData(venue_data, shows_data):
+from flask import abort, copy_current_request_context, current_app, has_request_context, request
 
-    past_shows = [show._asdict() for show in shows_data if datetime.strptime(
-        show.start_time, '%Y-%m-%dT%H:%M:%SZ') < datetime.now()]
+from cache import cache
+from instrumentation import measured, merge_stats
+from models import db, Show, Venue, Artist
+from queries import venue_shows, artist_shows, show_counts, similar_artists, fitting_artists
 
-    upcoming_shows = [show._asdict()
-                      for show in shows_data if datetime.strptime(
-        show.start_time, '%Y-%m-%dT%H:%M:%SZ') > datetime.now()]
+
+def VenueViewData(venue_data, past_shows, upcoming_shows, shows_counts, recommended_artists):
 
     venue_view_data = {
         "id": venue_data.id,
         "name": venue_data.name,
-        "genres": venue_data.genres,
+        "genres": list(venue_data.genres),
         "address": venue_data.address,
         "city": venue_data.city,
         "state": venue_data.state,
@@ -22,8 +25,9 @@ def VenueViewData(venue_data, shows_data):
         "image_link": venue_data.image_link,
         "past_shows": past_shows,
         "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
+        "past_shows_count": shows_counts["past_shows_count"],
+        "upcoming_shows_count": shows_counts["upcoming_shows_count"],
+        "recommended_artists": recommended_artists,
     }
     if venue_data.website:
         venue_view_data["website"] = venue_data.website
@@ -35,19 +39,12 @@ def VenueViewData(venue_data, shows_data):
     return(venue_view_data)
 
 
-def ArtistViewData(artist_data, shows_data):
-
-    past_shows = [show._asdict() for show in shows_data if datetime.strptime(
-        show.start_time, '%Y-%m-%dT%H:%M:%SZ') < datetime.now()]
-
-    upcoming_shows = [show._asdict()
-                      for show in shows_data if datetime.strptime(
-        show.start_time, '%Y-%m-%dT%H:%M:%SZ') > datetime.now()]
+def ArtistViewData(artist_data, past_shows, upcoming_shows, shows_counts, similar_artists):
 
     artist_view_data = {
         "id": artist_data.id,
         "name": artist_data.name,
-        "genres": artist_data.genres,
+        "genres": list(artist_data.genres),
         "city": artist_data.city,
         "state": artist_data.state,
         "phone": artist_data.phone,
@@ -55,8 +52,9 @@ def ArtistViewData(artist_data, shows_data):
         "image_link": artist_data.image_link,
         "past_shows": past_shows,
         "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
+        "past_shows_count": shows_counts["past_shows_count"],
+        "upcoming_shows_count": shows_counts["upcoming_shows_count"],
+        "similar_artists": similar_artists,
     }
     if artist_data.website:
         artist_view_data["website"] = artist_data.website
@@ -66,3 +64,149 @@ def ArtistViewData(artist_data, shows_data):
         artist_view_data["seeking_description"] = artist_data.seeking_description
 
     return(artist_view_data)
+
+
+def page_args():
+    per_page = request.args.get('per_page', current_app.config['PAGE_SIZE'], type=int)
+    return {
+        "after": request.args.get('after'),
+        "before": request.args.get('before'),
+        "per_page": min(max(per_page, 1), current_app.config['MAX_PAGE_SIZE']),
+    }
+
+
+def parse_window_bound(value, inclusive_day=False):
+    """An ISO date or datetime argument. A date ending a window includes that day."""
+    if not value:
+        return None
+    try:
+        bound = datetime.fromisoformat(value)
+    except ValueError:
+        abort(400)
+    if inclusive_day and len(value) == 10:
+        bound += timedelta(days=1)
+    return bound
+
+
+def window_args():
+    """Time window and filters of a shows listing from the request arguments.
+
+    ``from`` and ``to`` take ISO dates or datetimes, ``to`` is excluded
+    unless it is a date.
+    """
+    return {
+        "start": parse_window_bound(request.args.get('from')),
+        "end": parse_window_bound(request.args.get('to'), inclusive_day=True),
+        "city": request.args.get('city'),
+        "state": request.args.get('state'),
+        "genre": request.args.get('genre'),
+        "venue_id": request.args.get('venue_id', type=int),
+        "artist_id": request.args.get('artist_id', type=int),
+    }
+
+
+def nearby_args():
+    """Point, radius and limit of a nearby venues search from the request arguments.
+
+    The point is given by ``lat`` and ``lng``, or is the location of venue
+    ``venue_id``, which is then left out of the results.
+    """
+    config = current_app.config
+    venue_id = request.args.get('venue_id', type=int)
+    if venue_id:
+        venue = Venue.query.with_entities(Venue.latitude, Venue.longitude).filter(
+            Venue.id == venue_id).one_or_none()
+        if venue is None:
+            abort(404)
+        latitude, longitude = venue
+    else:
+        latitude = request.args.get('lat', type=float)
+        longitude = request.args.get('lng', type=float)
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        abort(400)
+
+    radius = request.args.get('radius', config['NEARBY_RADIUS'], type=float)
+    limit = request.args.get('limit', config['NEARBY_LIMIT'], type=int)
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "radius": min(max(radius, 0.1), config['NEARBY_MAX_RADIUS']),
+        "limit": min(max(limit, 1), config['NEARBY_MAX_LIMIT']),
+        "exclude_id": venue_id,
+    }
+
+
+def show_list_limits():
+    size = current_app.config['SHOW_LIST_SIZE']
+    return {
+        key: min(max(request.args.get(key, size, type=int), 1), current_app.config['MAX_PAGE_SIZE'])
+        for key in ('past', 'upcoming')
+    }
+
+
+query_executor = None
+query_executor_lock = threading.Lock()
+
+
+def in_parallel(*calls):
+    """Results of ``calls``, independent queries issued at the same time.
+
+    Each call runs on a worker thread with a copy of the request context, so
+    it gets its own session and connection, and its statements are added to
+    the request's instrumentation. The request's own connection is released
+    first, so a waiting request holds none. Calls run one after the other
+    when DETAIL_QUERY_WORKERS is below 2 or outside of a request.
+    """
+    global query_executor
+
+    workers = current_app.config['DETAIL_QUERY_WORKERS']
+    if workers < 2 or not has_request_context():
+        return [call() for call in calls]
+
+    db.session.close()
+
+    with query_executor_lock:
+        if query_executor is None:
+            query_executor = ThreadPoolExecutor(workers, thread_name_prefix='detail-query')
+
+    futures = [query_executor.submit(copy_current_request_context(lambda call=call: measured(call)))
+               for call in calls]
+    results = list()
+    for future in futures:
+        result, stats = future.result()
+        merge_stats(stats)
+        results.append(result)
+    return results
+
+
+def venue_view_data(venue_id, limits):
+    def build():
+        return VenueViewData(*in_parallel(
+            lambda: Venue.query.get(venue_id),
+            lambda: venue_shows(venue_id, upcoming=False, limit=limits["past"]),
+            lambda: venue_shows(venue_id, upcoming=True, limit=limits["upcoming"]),
+            lambda: show_counts(Show.c.venue_id, venue_id),
+            lambda: fitting_artists(venue_id)))
+
+    def tags(data):
+        artists = data["past_shows"] + data["upcoming_shows"] + data["recommended_artists"]
+        return {f'venue:{venue_id}', 'recommendations'} | {f'artist:{a["artist_id"]}' for a in artists}
+
+    return cache.get_or_set(f'venue:{venue_id}:{limits["past"]}:{limits["upcoming"]}', build, tags)
+
+
+def artist_view_data(artist_id, limits):
+    def build():
+        return ArtistViewData(*in_parallel(
+            lambda: Artist.query.get(artist_id),
+            lambda: artist_shows(artist_id, upcoming=False, limit=limits["past"]),
+            lambda: artist_shows(artist_id, upcoming=True, limit=limits["upcoming"]),
+            lambda: show_counts(Show.c.artist_id, artist_id),
+            lambda: similar_artists(artist_id)))
+
+    def tags(data):
+        shows = data["past_shows"] + data["upcoming_shows"]
+        return ({f'artist:{artist_id}', 'recommendations'} | {f'venue:{s["venue_id"]}' for s in shows}
+                | {f'artist:{a["artist_id"]}' for a in data["similar_artists"]})
+
+    return cache.get_or_set(f'artist:{artist_id}:{limits["past"]}:{limits["upcoming"]}', build, tags)
@@ -0,0 +1,82 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from models import db, TableVersion
+
+#----------------------------------------------------------------------------#
+# Table versions.
+#
+# TableVersion keeps a counter per table that is incremented once the
+# transaction of an INSERT, UPDATE or DELETE of the table commits, whether
+# the write came from the ORM or from Core. A version is then one primary key
+# read rather than aggregates over the whole table, and deletions count like
+# any write. Genre rows count as writes of their venue or artist.
+#
+# Writes only mark their connection with the tables they touched; the
+# counters are bumped in a short transaction of their own after the commit,
+# one row at a time in name order, so writers never hold a counter row
+# locked while they work and cannot deadlock on them. A reader may still see
+# the new rows under the old version for that instant, never the reverse.
+# Writes that bypass SQLAlchemy, such as COPY, call mark_written themselves.
+#----------------------------------------------------------------------------#
+
+VERSIONED = {
+    "Venue": "Venue",
+    "Artist": "Artist",
+    "Show": "Show",
+    "VenueGenre": "Venue",
+    "ArtistGenre": "Artist",
+}
+
+
+def mark_written(connection, *table_names):
+    names = {VERSIONED[name] for name in table_names if name in VERSIONED}
+    if names:
+        connection.info.setdefault('written_tables', set()).update(names)
+
+
+def bump_versions(connection, names):
+    with connection.begin():
+        for name in sorted(names):
+            connection.execute(TableVersion.__table__.update().where(
+                TableVersion.name == name).values(version=TableVersion.version + 1))
+
+
+def after_execute(conn, clauseelement, multiparams, params, *args):
+    if isinstance(clauseelement, UpdateBase):
+        mark_written(conn, clauseelement.table.name)
+
+
+def after_begin(session, transaction, connection):
+    # the info dict outlives the connection, which is closed with the transaction
+    session.info.setdefault('connections', dict())[connection] = connection.info
+
+
+def after_commit(session):
+    for connection, info in session.info.get('connections', {}).items():
+        names = info.pop('written_tables', None)
+        if names:
+            bump_versions(connection, names)
+
+
+def after_transaction_end(session, transaction):
+    # the writes of a transaction rolled back or closed are forgotten
+    if transaction.parent is None:
+        for info in session.info.pop('connections', {}).values():
+            info.pop('written_tables', None)
+
+
+def table_versions(*table_names):
+    """Current versions of ``table_names``, None for a table without a counter."""
+    versions = dict(db.session.query(TableVersion.name, TableVersion.version).filter(
+        TableVersion.name.in_(table_names)))
+    return [versions.get(name) for name in table_names]
+
+
+if not event.contains(Engine, 'after_execute', after_execute):
+    event.listen(Engine, 'after_execute', after_execute)
+    event.listen(Session, 'after_begin', after_begin)
+    event.listen(Session, 'after_commit', after_commit)
+    event.listen(Session, 'after_transaction_end', after_transaction_end)